@@ -0,0 +1,196 @@
+import asyncio
+from collections import deque
+from RSA import RSA
+from RSACrypt import RSACrypt
+from KeyIO import KeyFormat
+
+class AsyncCrypt():
+    """
+    This class has the asyncio counterparts of the RSACrypt methods and of the RSA read methods.
+    The exponentiations are run in an executor, so the event loop is not blocked while they run.
+
+    The executor can be a ThreadPoolExecutor or a ProcessPoolExecutor, None uses the loop default one (threads).
+    Since a single exponentiation doesn't release the GIL, with threads the loop can still be
+    stopped for the length of one block; use a ProcessPoolExecutor to keep the loop latency flat with big keys.
+    This class has only static methods.
+    """
+
+    # the number of batches that can be in the executor at the same time, before the reader is stopped
+    MaxPending = 4
+
+    @staticmethod
+    async def crypt_bytes(key,data,executor=None):
+        """Perform the encryption/decryption of a byte array in an executor.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            data (bytes): a message to encrypt/decrypt.
+            executor (Executor, optional): the executor the blocks are processed in. Defaults to None.
+
+        Returns:
+            bytes: the encrypted/decrypted message as a byte array.
+        """
+        key = RSACrypt.prepare_key(key)
+        return await asyncio.get_running_loop().run_in_executor(executor,RSACrypt.crypt_bytes,key,data)
+
+    @staticmethod
+    async def crypt_string(key,str,executor=None):
+        """Perform the encryption/decryption of a string in an executor.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            str (str): a message to encrypt/decrypt.
+            executor (Executor, optional): the executor the blocks are processed in. Defaults to None.
+
+        Returns:
+            bytes: the encrypted/decrypted message as a byte array.
+        """
+        return await AsyncCrypt.crypt_bytes(key,str.encode(),executor)
+
+    @staticmethod
+    async def crypt_file(key,filename,executor=None):
+        """Perform the reading from a file and encrypt/decrypt it's content in an executor.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            filename (str): the name of the file to open.
+            executor (Executor, optional): the executor the file is processed in. Defaults to None.
+
+        Returns:
+            bytes: the encrypted/decrypted message as a byte array.
+        """
+        key = RSACrypt.prepare_key(key)
+        return await asyncio.get_running_loop().run_in_executor(executor,RSACrypt.crypt_file,key,filename)
+
+    @staticmethod
+    async def iter_crypt(key,source,executor=None):
+        """Perform the encryption/decryption of a stream.
+        This is an async generator, the blocks are sent to the executor in batches of RSACrypt.WorkerBatch
+        and at most MaxPending batches are in the executor, so a slow consumer stops the reading.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (StreamReader | async iterable): the stream, or an async iterable of bytes chunks.
+            executor (Executor, optional): the executor the blocks are processed in. Defaults to None.
+
+        Yields:
+            bytes: the encrypted/decrypted data, a batch of blocks at a time.
+        """
+        key = RSACrypt.prepare_key(key)
+        # it raises RSACrypt.UnknownDirection if the key type is unknown
+        chunk, _ = RSACrypt.block_geometry(key)
+        loop = asyncio.get_running_loop()
+        batch_size = chunk * RSACrypt.WorkerBatch
+        pending = deque()
+        # a batch is sent only when the next one is read, to know which one is the last
+        previous = None
+        async for batch in AsyncCrypt.__read_batches(source,batch_size):
+            if previous is not None:
+                pending.append(loop.run_in_executor(executor,AsyncCrypt._crypt_batch,key,previous,False))
+                if len(pending) >= AsyncCrypt.MaxPending:
+                    yield await pending.popleft()
+            previous = batch
+        if previous is not None:
+            pending.append(loop.run_in_executor(executor,AsyncCrypt._crypt_batch,key,previous,True))
+        while pending:
+            yield await pending.popleft()
+
+    @staticmethod
+    def _crypt_batch(key,batch,last):
+        """Perform RSACrypt.crypt_bytes on a batch, it's run in the executor.
+        crypt_bytes removes the leading zeros of the last decrypted block,
+        they are put back if the batch is not the last one of the stream.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            batch (bytes): the batch.
+            last (bool): whether it's the last batch of the stream.
+
+        Returns:
+            bytes: the encrypted/decrypted batch.
+        """
+        data = RSACrypt.crypt_bytes(key,batch)
+        if last or not key.decrypts:
+            return data
+        start = (len(batch)//key.chunk - 1) * key.block_width
+        return data[:start] + data[start:].rjust(key.block_width,b"\0")
+
+    @staticmethod
+    async def crypt_stream(key,source,destination,executor=None):
+        """Perform the encryption/decryption of a stream and write the result to another one.
+        The writer is drained after every batch, so a slow destination stops the reading.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (StreamReader | async iterable): the stream, or an async iterable of bytes chunks.
+            destination (StreamWriter): the stream the result is written to, anything with write and (optionally) an async drain.
+            executor (Executor, optional): the executor the blocks are processed in. Defaults to None.
+
+        Returns:
+            int: the number of bytes written.
+        """
+        written = 0
+        async for data in AsyncCrypt.iter_crypt(key,source,executor):
+            destination.write(data)
+            written += len(data)
+            if hasattr(destination,'drain'):
+                await destination.drain()
+        return written
+
+    @staticmethod
+    async def readKey(file_name,format=KeyFormat.ASCII,executor=None):
+        """Read a key from a file in an executor, see RSA.readKey.
+
+        Args:
+            file_name (str): the file where the key is saved.
+            format (KeyFormat, optional): the format the key is saved as. Defaults to KeyFormat.ASCII.
+            executor (Executor, optional): the executor the file is read in. Defaults to None.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor,RSA.readKey,file_name,format)
+
+    @staticmethod
+    async def readKeys(priv_file_name,pub_file_name,format=KeyFormat.ASCII,executor=None):
+        """Read 2 keys from a file in an executor, see RSA.readKeys.
+
+        Args:
+            priv_file_name (str): the file where the private key is saved.
+            pub_file_name (str): the file where the public key is saved.
+            format (KeyFormat, optional): the format of the files containg the keys. Defaults to KeyFormat.ASCII.
+            executor (Executor, optional): the executor the files are read in. Defaults to None.
+
+        Returns:
+            (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor,RSA.readKeys,priv_file_name,pub_file_name,format)
+
+    @staticmethod
+    async def __read_batches(source,batch_size):
+        """Divide a stream into batches of the given size, the last one can be shorter.
+
+        Args:
+            source (StreamReader | async iterable): the stream, or an async iterable of bytes chunks.
+            batch_size (int): the batch size in bytes, a multiple of the block size.
+
+        Yields:
+            bytes: a batch of the stream.
+        """
+        if hasattr(source,'readexactly'):
+            while True:
+                try:
+                    yield await source.readexactly(batch_size)
+                except asyncio.IncompleteReadError as error:
+                    if error.partial:
+                        yield error.partial
+                    return
+
+        buffer = bytearray()
+        async for data in source:
+            buffer += data
+            while len(buffer) >= batch_size:
+                yield bytes(buffer[:batch_size])
+                del buffer[:batch_size]
+        if buffer:
+            yield bytes(buffer)
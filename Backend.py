@@ -0,0 +1,264 @@
+import importlib.util
+import math
+import os
+import random
+from Crypto.Util.number import getPrime, isPrime, bytes_to_long
+from Crypto.Random import get_random_bytes
+
+# gmpy2 is imported the first time it's used, importing it takes longer than the rest of the modules
+gmpy2 = None
+
+def _import_gmpy2():
+    """Import gmpy2.
+
+    Raises:
+        BackendUnavailable: gmpy2 is not installed.
+    """
+    global gmpy2
+    if gmpy2 is None:
+        try:
+            import gmpy2 as module
+        except ImportError:
+            raise BackendUnavailable
+        gmpy2 = module
+    return gmpy2
+
+def _to_bytes(n,blocksize=0):
+    """The same as pycryptodome long_to_bytes, but with the builtin int.to_bytes (it's much faster).
+
+    Args:
+        n (int): a non-negative integer.
+        blocksize (int, optional): the length of the result is a multiple of it, 0 means the minimal length. Defaults to 0.
+
+    Returns:
+        bytes: n big endian, at least 1 byte.
+    """
+    if n < 0 or blocksize < 0:
+        raise ValueError("Values must be non-negative")
+    length = max(1,(n.bit_length()+7)//8)
+    if blocksize:
+        length = -(-length//blocksize) * blocksize
+    return n.to_bytes(length,"big")
+
+def _from_bytes(data):
+    """The same as pycryptodome bytes_to_long, but with the builtin int.from_bytes.
+    It accepts any bytes-like object, a memoryview slice is not copied.
+    """
+    return int.from_bytes(data,"big")
+
+def _gmpy2_installed():
+    return gmpy2 is not None or importlib.util.find_spec("gmpy2") is not None
+
+UnknownBackend = Exception("Unknown big integer backend")
+BackendUnavailable = Exception("The big integer backend is not installed")
+
+class _PythonBackend():
+    """
+    The builtin int arithmetic, and pycryptodome for the primes.
+    """
+    powmod = pow
+
+    @staticmethod
+    def invert(a,m):
+        return pow(a,-1,m)
+
+    @staticmethod
+    def gcd(a,b):
+        return math.gcd(a,b)
+
+    @staticmethod
+    def is_prime(n):
+        return isPrime(n,randfunc=get_random_bytes)
+
+    @staticmethod
+    def get_prime(bits):
+        return getPrime(bits,get_random_bytes)
+
+    integer = int
+
+class _Gmpy2Backend():
+    """
+    The GMP arithmetic, every result is turned back into an int
+    so that the rest of the code (and the saved keys) don't see mpz values.
+    """
+    @staticmethod
+    def powmod(base,exponent,modulus):
+        return int(gmpy2.powmod(base,exponent,modulus))
+
+    @staticmethod
+    def invert(a,m):
+        try:
+            return int(gmpy2.invert(a,m))
+        except ZeroDivisionError:
+            # the same exception of pow(a,-1,m)
+            raise ValueError("base is not invertible for the given modulus")
+
+    @staticmethod
+    def gcd(a,b):
+        return int(gmpy2.gcd(a,b))
+
+    @staticmethod
+    def is_prime(n):
+        return bool(gmpy2.is_prime(n,Backend.PrimeReps))
+
+    @staticmethod
+    def integer(value):
+        return gmpy2.mpz(value)
+
+    @staticmethod
+    def get_prime(bits):
+        if bits < 2:
+            # the same exception of getPrime
+            raise ValueError("N must be larger than 1")
+        while True:
+            # a random number with the highest bit set, and the next prime after it
+            candidate = bytes_to_long(get_random_bytes((bits+7)//8)) >> (-bits % 8)
+            candidate |= 1 << (bits-1)
+            prime = int(gmpy2.next_prime(candidate))
+            if prime.bit_length() == bits:
+                return prime
+
+class Backend():
+    """
+    This class routes the big integer operations used by RSA, RSACrypt and euclidean_algorithm
+    (modular exponentiation, modular inverse, GCD, primality test, prime generation and bytes conversion)
+    to an implementation:
+    - "python": the builtin int and pycryptodome.
+    - "gmpy2": GMP through gmpy2, much faster with 4096 bits and bigger moduli.
+    - "auto": gmpy2 when it's installed, python otherwise.
+
+    The backend is chosen at import time with the RSA_BACKEND environment variable (default "auto"),
+    or later with Backend.use. Every backend returns int values, so the results are the same.
+    The chosen backend is loaded on the first operation, so importing this module doesn't import gmpy2.
+    The bytes conversion is the same in every backend, int.from_bytes and int.to_bytes are already in C.
+    Backend.integer converts an int to the backend number type (int or gmpy2.mpz), for the code that does
+    long chains of products on very big numbers (like batch_gcd), where GMP multiplication is much faster.
+
+    Example:
+    > Backend.use("python")
+    > Backend.powmod(m,e,n)
+    This class has only static methods.
+    """
+    Backends = ("python","gmpy2")
+    Functions = ("powmod","invert","gcd","is_prime","get_prime","integer")
+    name = None
+    # the Miller-Rabin rounds of the gmpy2 primality test
+    PrimeReps = 25
+
+    powmod = staticmethod(pow)
+    to_bytes = staticmethod(_to_bytes)
+    from_bytes = staticmethod(_from_bytes)
+
+    @staticmethod
+    def use(name="auto",lazy=False):
+        """Choose the backend.
+
+        Args:
+            name (str, optional): "python", "gmpy2" or "auto". Defaults to "auto".
+            lazy (bool, optional): load the backend on the first operation instead of now. Defaults to False.
+
+        Raises:
+            UnknownBackend: the name is not a backend.
+            BackendUnavailable: gmpy2 is not installed.
+
+        Returns:
+            str: the name of the chosen backend.
+        """
+        implementation = Backend.__implementation(name)
+        Backend.name = "gmpy2" if implementation is _Gmpy2Backend else "python"
+        if implementation is _Gmpy2Backend:
+            if lazy:
+                for function in Backend.Functions:
+                    setattr(Backend,function,staticmethod(Backend.__loader(function)))
+                return Backend.name
+            _import_gmpy2()
+        for function in Backend.Functions:
+            setattr(Backend,function,staticmethod(getattr(implementation,function)))
+        return Backend.name
+
+    @staticmethod
+    def available():
+        """The backends that can be used.
+
+        Returns:
+            list: the names of the backends.
+        """
+        return [name for name in Backend.Backends if name != "gmpy2" or _gmpy2_installed()]
+
+    @staticmethod
+    def self_test(bits=(512,1024,4096),rounds=20,seed=None):
+        """Check that the gmpy2 and python backends give the same results on random values.
+
+        Args:
+            bits (tuple, optional): the lengths of the tested values. Defaults to (512,1024,4096).
+            rounds (int, optional): the number of values tested for each length. Defaults to 20.
+            seed (int, optional): the seed of the random values. Defaults to None.
+
+        Raises:
+            BackendUnavailable: gmpy2 is not installed, there is nothing to compare.
+
+        Returns:
+            list: a (operation, arguments) tuple for every mismatch, it's empty when the backends agree.
+        """
+        _import_gmpy2()
+        generator = random.Random(seed)
+        mismatches = []
+
+        def check(operation,*args):
+            results = []
+            for implementation in (_PythonBackend,_Gmpy2Backend):
+                try:
+                    result = getattr(implementation,operation)(*args)
+                except ValueError:
+                    result = ValueError
+                results.append((result,type(result)))
+            if results[0] != results[1]:
+                mismatches.append((operation,args))
+
+        # small primes, composites and Carmichael numbers
+        for n in (2,3,4,17,561,1105,2**61-1,2**64+1,2**89-1,2**127-1,(2**127-1)*(2**61-1)):
+            check("is_prime",n)
+        for length in bits:
+            for _ in range(rounds):
+                a, b, m = (generator.getrandbits(length) for _ in range(3))
+                m |= 1
+                check("powmod",a,b,m)
+                check("gcd",a,b)
+                check("gcd",a*b,b)
+                check("invert",a,m)
+                check("invert",a*m,m)
+            for implementation in (_PythonBackend,_Gmpy2Backend):
+                prime = implementation.get_prime(min(length,1024))
+                if prime.bit_length() != min(length,1024) or not (_PythonBackend.is_prime(prime) and _Gmpy2Backend.is_prime(prime)):
+                    mismatches.append(("get_prime",(implementation.__name__,prime)))
+        return mismatches
+
+    @staticmethod
+    def __implementation(name):
+        if name == "auto":
+            return _Gmpy2Backend if _gmpy2_installed() else _PythonBackend
+        if name not in Backend.Backends:
+            raise UnknownBackend
+        if name == "gmpy2":
+            if not _gmpy2_installed():
+                raise BackendUnavailable
+            return _Gmpy2Backend
+        return _PythonBackend
+
+    @staticmethod
+    def __loader(function):
+        """A function that loads the backend and then runs the operation, it replaces itself on the first call.
+        """
+        def load(*args):
+            Backend.use(Backend.name)
+            return getattr(Backend,function)(*args)
+        return load
+
+Backend.use(os.environ.get("RSA_BACKEND","auto"),lazy=True)
+
+if __name__ == "__main__":
+    mismatches = Backend.self_test()
+    for operation, args in mismatches:
+        print("MISMATCH", operation, args)
+    print("backend:", Backend.name, "-", "OK" if not mismatches else "%d mismatches" % len(mismatches))
+    raise SystemExit(1 if mismatches else 0)
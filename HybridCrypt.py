@@ -0,0 +1,267 @@
+import io
+import secrets
+import struct
+from os import PathLike
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from Crypto.Random import get_random_bytes
+from RSACrypt import RSACrypt
+from Metrics import Metrics
+
+class HybridCrypt():
+    """
+    This class handles the hybrid encryption: the data is encrypted with AES-256-GCM
+    and only the AES key is encrypted with RSA, so a file of any size costs a single exponentiation.
+
+    The AES key is made like in RSA-KEM: a random r smaller than n is encrypted with the RSA key,
+    and the AES key is derived from r with HKDF-SHA256. Decrypting r with the other key of the pair gives the same AES key.
+    As with RSACrypt either key of the pair can be used to encrypt, and the other one decrypts.
+
+    The container is made of a header (the key fingerprint, the segment size, the nonce prefix and the encrypted r)
+    and the data divided in segments, each one encrypted and authenticated by itself,
+    so it can be written and read as a stream. The last segment is marked in its nonce,
+    and every segment authenticates the header, so a truncated or modified container is always detected.
+
+    Example:
+    > HybridCrypt.encrypt(public,"file.txt","file.rsah")
+    > HybridCrypt.decrypt(private,"file.rsah","file.txt")
+    This class has only static methods.
+
+    Raises:
+        HybridCrypt.InvalidContainer: the data is not a hybrid container or its version is not supported.
+        HybridCrypt.WrongKey: the key fingerprint doesn't match the container one.
+        HybridCrypt.Tampered: a segment was modified, removed or the container was truncated.
+    """
+    InvalidContainer = Exception("Invalid RSA hybrid container")
+    WrongKey = RSACrypt.WrongKey
+    Tampered = Exception("The hybrid container was modified or truncated")
+
+    # magic, version, key fingerprint, segment size, nonce prefix, length of the encrypted r
+    Magic = b"RSAH"
+    Version = 1
+    Header = struct.Struct(">4sB32sI7sH")
+    TagSize = 16
+    # the plaintext bytes of every segment but the last one
+    SegmentSize = 2**18
+    KDFContext = b"RSAH v1 AES-256-GCM key"
+
+    @staticmethod
+    def encrypt(key,source,destination,segment_size=None):
+        """
+        Encrypt a source into a hybrid container.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file | bytes): a file name, a binary file opened for reading or a bytes-like object.
+            destination (str | file): a file name or a binary file opened for writing.
+            segment_size (int, optional): the plaintext bytes of each segment. Defaults to SegmentSize.
+
+        Returns:
+            int: the number of bytes written to the destination.
+        """
+        if not hasattr(destination,'write'):
+            with open(destination,"wb") as file:
+                return HybridCrypt.encrypt(key,source,file,segment_size)
+        if isinstance(source,(str,PathLike)):
+            with open(source,"rb") as file:
+                return HybridCrypt.encrypt(key,file,destination,segment_size)
+        if not hasattr(source,'read'):
+            source = io.BytesIO(source)
+
+        key = RSACrypt.prepare_key(key)
+        segment_size = segment_size or HybridCrypt.SegmentSize
+        # r < n, so it can be encrypted as a single block
+        r = secrets.randbelow(key.modulus - 2) + 2
+        wrapped = RSACrypt.crypt_int(key,r).to_bytes(key.width,"big")
+        prefix = get_random_bytes(7)
+        header = HybridCrypt.Header.pack(HybridCrypt.Magic,HybridCrypt.Version,key.fingerprint,segment_size,prefix,len(wrapped)) + wrapped
+        session = HybridCrypt.__session_key(r,key.width)
+
+        destination.write(header)
+        written = len(header)
+        read = 0
+        segment = HybridCrypt.__read(source,segment_size)
+        index = 0
+        while True:
+            following = HybridCrypt.__read(source,segment_size) if len(segment) == segment_size else b''
+            last = not following
+            cipher = HybridCrypt.__cipher(session,prefix,index,last,header)
+            data, tag = cipher.encrypt_and_digest(segment)
+            destination.write(data)
+            destination.write(tag)
+            read += len(segment)
+            written += len(data) + len(tag)
+            if last:
+                break
+            segment = following
+            index += 1
+        Metrics.record("hybrid.bytes_in",read)
+        Metrics.record("hybrid.bytes_out",written)
+        return written
+
+    @staticmethod
+    def decrypt(key,source,destination):
+        """
+        Decrypt a hybrid container, every segment is written only after it's authenticated.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key, the other key of the pair that encrypted the container.
+            source (str | file | bytes): a file name, a binary file opened for reading or a bytes-like object.
+            destination (str | file): a file name or a binary file opened for writing.
+
+        Raises:
+            HybridCrypt.InvalidContainer: the source is not a hybrid container.
+            HybridCrypt.WrongKey: the key fingerprint doesn't match the container one.
+            HybridCrypt.Tampered: the container was modified or truncated.
+
+        Returns:
+            int: the number of bytes written to the destination.
+        """
+        if isinstance(source,(str,PathLike)):
+            with open(source,"rb") as file:
+                return HybridCrypt.decrypt(key,file,destination)
+        if not hasattr(source,'read'):
+            source = io.BytesIO(source)
+        if not hasattr(destination,'write'):
+            with open(destination,"wb") as file:
+                return HybridCrypt.decrypt(key,source,file)
+
+        key = RSACrypt.prepare_key(key)
+        info = HybridCrypt.read_header(source)
+        if info['fingerprint'] != key.fingerprint:
+            raise HybridCrypt.WrongKey
+        header = info['header']
+        r = RSACrypt.crypt_int(key,int.from_bytes(info['wrapped key'],"big"))
+        session = HybridCrypt.__session_key(r,key.width)
+
+        size = info['segment size'] + HybridCrypt.TagSize
+        read = len(header)
+        written = 0
+        segment = HybridCrypt.__read(source,size)
+        index = 0
+        while True:
+            if len(segment) < HybridCrypt.TagSize:
+                raise HybridCrypt.Tampered
+            following = HybridCrypt.__read(source,size) if len(segment) == size else b''
+            last = not following
+            cipher = HybridCrypt.__cipher(session,info['nonce prefix'],index,last,header)
+            try:
+                data = cipher.decrypt_and_verify(segment[:-HybridCrypt.TagSize],segment[-HybridCrypt.TagSize:])
+            except ValueError:
+                raise HybridCrypt.Tampered
+            destination.write(data)
+            read += len(segment)
+            written += len(data)
+            if last:
+                break
+            segment = following
+            index += 1
+        Metrics.record("hybrid.bytes_in",read)
+        Metrics.record("hybrid.bytes_out",written)
+        return written
+
+    @staticmethod
+    def encrypt_bytes(key,data,segment_size=None):
+        """
+        Encrypt a byte array into a hybrid container.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            data (bytes): the message to encrypt.
+            segment_size (int, optional): the plaintext bytes of each segment. Defaults to SegmentSize.
+
+        Returns:
+            bytes: the container.
+        """
+        destination = io.BytesIO()
+        HybridCrypt.encrypt(key,data,destination,segment_size)
+        return destination.getvalue()
+
+    @staticmethod
+    def decrypt_bytes(key,data):
+        """
+        Decrypt a hybrid container held in a byte array.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            data (bytes): the container.
+
+        Raises:
+            HybridCrypt.InvalidContainer: the data is not a hybrid container.
+            HybridCrypt.WrongKey: the key fingerprint doesn't match the container one.
+            HybridCrypt.Tampered: the container was modified or truncated.
+
+        Returns:
+            bytes: the decrypted message.
+        """
+        destination = io.BytesIO()
+        HybridCrypt.decrypt(key,data,destination)
+        return destination.getvalue()
+
+    @staticmethod
+    def read_header(file):
+        """
+        Read the header of a hybrid container.
+
+        Args:
+            file (file): a binary file opened for reading, positioned at the start of the container.
+
+        Raises:
+            HybridCrypt.InvalidContainer: the file is not a hybrid container or its version is not supported.
+
+        Returns:
+            dict: a dictionary with the version, fingerprint, segment size, nonce prefix, wrapped key and the raw header.
+        """
+        data = HybridCrypt.__read(file,HybridCrypt.Header.size)
+        if len(data) != HybridCrypt.Header.size:
+            raise HybridCrypt.InvalidContainer
+        magic, version, fingerprint, segment_size, prefix, wrapped_length = HybridCrypt.Header.unpack(data)
+        if magic != HybridCrypt.Magic or version != HybridCrypt.Version or segment_size == 0:
+            raise HybridCrypt.InvalidContainer
+        wrapped = HybridCrypt.__read(file,wrapped_length)
+        if len(wrapped) != wrapped_length:
+            raise HybridCrypt.InvalidContainer
+        return {
+            "version":version,
+            "fingerprint":fingerprint,
+            "segment size":segment_size,
+            "nonce prefix":prefix,
+            "wrapped key":wrapped,
+            "header":data + wrapped
+        }
+
+    @staticmethod
+    def __session_key(r,width):
+        """
+        Derive the AES key from the random r.
+        """
+        return HKDF(r.to_bytes(width,"big"),32,b"",SHA256,context=HybridCrypt.KDFContext)
+
+    @staticmethod
+    def __cipher(session,prefix,index,last,header):
+        """
+        Make the AES-GCM cipher of a segment: the nonce is the prefix, the segment index and the last segment flag,
+        and the header is authenticated with every segment.
+        """
+        cipher = AES.new(session,AES.MODE_GCM,nonce=prefix + struct.pack(">IB",index,last))
+        cipher.update(header)
+        return cipher
+
+    @staticmethod
+    def __read(file,size):
+        """
+        Read exactly size bytes from a file, less only at its end.
+        """
+        data = file.read(size)
+        if len(data) == size or not data:
+            return data
+        parts = [data]
+        size -= len(data)
+        while size:
+            data = file.read(size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
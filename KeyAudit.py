@@ -0,0 +1,255 @@
+"""Find the RSA keys that share a prime factor with other keys, with the batch GCD.
+
+Audit the keys in some directories and key rings, with 4 processes:
+> python KeyAudit.py keys/ old_keys/ --ring keys.ring -j 4
+The exit code is 1 if some keys share a factor or the same module.
+"""
+import argparse
+import os
+import sys
+import time
+
+from Backend import Backend
+from euclidean_algorithm import euclidean, product_tree, remainders_squared
+from KeyIO import KeyFormat
+from KeyRing import KeyRing
+from Metrics import Metrics
+from RSA import RSA
+
+class KeyAudit():
+    """
+    This class finds the keys whose n module shares a prime factor with the module of another key,
+    anyone can then factor both modules with a single GCD.
+
+    Comparing every pair of modules is N², so the batch GCD (see euclidean_algorithm.batch_gcd) is used instead.
+    The modules are divided in shards of ShardSize, to keep the memory used bounded:
+    the product of every shard is calculated first, then for each shard the product of all the shards
+    is reduced with the remainder tree of that shard only. The shards can be divided between processes.
+    Only the few modules found to share a factor are then compared pair by pair, to know which keys they share it with.
+    Before that the keys with the same module are reported: the owner of each one can factor it with its own private exponent.
+    The sources of a module are the ids of its keys followed by their type (like "keys/a.pub (public key)"),
+    a private and a public key with the same module are a key pair, more keys of the same type share the module.
+
+    Example:
+    > moduli = KeyAudit.load_directory("keys/")
+    > for finding in KeyAudit.audit(moduli, workers=4):
+    >     print(finding['finding'], finding['keys'], finding['shares with'])
+    This class has only static methods.
+    """
+    # the number of modules in a shard, the memory of a shard remainder tree grows with it
+    ShardSize = 8192
+
+    @staticmethod
+    def load_files(file_names,format=KeyFormat.AUTO):
+        """Read the n module of some key files.
+
+        Args:
+            file_names (iterable): the files where the keys are saved.
+            format (KeyFormat | str, optional): the format the keys are saved as. Defaults to KeyFormat.AUTO.
+
+        Returns:
+            dict: the sources ("file (type)") of every module.
+        """
+        moduli = {}
+        for file_name in file_names:
+            key = RSA.readKey(file_name,format,cache=False)
+            moduli.setdefault(key['mod n'],[]).append("%s (%s)" % (file_name,key['type']))
+        return moduli
+
+    @staticmethod
+    def load_directory(directory,format=KeyFormat.AUTO):
+        """Read the n module of every key in a directory (see RSA.readDirectory).
+
+        Args:
+            directory (str): the directory where the keys are saved.
+            format (KeyFormat | str, optional): the format the keys are saved as. Defaults to KeyFormat.AUTO.
+
+        Returns:
+            dict: the sources ("file (type)") of every module.
+        """
+        moduli = {}
+        for file_name, key in RSA.readDirectory(directory,format,cache=False).items():
+            moduli.setdefault(key['mod n'],[]).append("%s (%s)" % (file_name,key['type']))
+        return moduli
+
+    @staticmethod
+    def load_ring(file_name):
+        """Read the n module of every key in a key ring.
+
+        Args:
+            file_name (str): the key ring file.
+
+        Returns:
+            dict: the sources ("file:name (type)") of every module.
+        """
+        moduli = {}
+        with KeyRing(file_name) as ring:
+            for key in ring:
+                name = key['metadata'].get('name',"Unknown") if isinstance(key['metadata'],dict) else "Unknown"
+                moduli.setdefault(key['mod n'],[]).append("%s:%s (%s)" % (file_name,name,key['type']))
+        return moduli
+
+    @staticmethod
+    def merge(*moduli):
+        """Merge the results of more load methods.
+
+        Returns:
+            dict: the sources of every module.
+        """
+        merged = {}
+        for sources in moduli:
+            for n, names in sources.items():
+                merged.setdefault(n,[]).extend(names)
+        return merged
+
+    @staticmethod
+    def audit(moduli,workers=None,shard_size=None):
+        """Find the modules used by more keys, and the modules that share a factor with other modules.
+        A module used by more keys is a "shared modulus" finding, unless its sources are only
+        the private and the public key of a pair (see is_shared). Then every module is checked once with the batch GCD.
+
+        Args:
+            moduli (dict | iterable): the sources of every module (see the load methods), or just the modules.
+            workers (int, optional): the number of processes the shards are divided between. Defaults to None.
+            shard_size (int, optional): the number of modules in a shard. Defaults to ShardSize.
+
+        Returns:
+            list: a dictionary for every weak module, with the kind of finding ("finding", "shared modulus" or "shared factor"),
+                  the module ("mod n"), its sources ("keys"), the GCD with the product of the other modules ("factor",
+                  the module itself for a shared modulus) and the sources of the modules it shares a factor with
+                  ("shares with", the modules themselves if they have no sources).
+        """
+        if not isinstance(moduli,dict):
+            moduli = {n:[] for n in moduli}
+        findings = [
+            {"finding":"shared modulus","mod n":n,"keys":sources,"factor":n,"shares with":sources}
+            for n, sources in moduli.items() if KeyAudit.is_shared(sources)
+        ]
+        values = list(moduli)
+        shard_size = shard_size or KeyAudit.ShardSize
+        shards = [values[i:i+shard_size] for i in range(0,len(values),shard_size)]
+
+        start = time.perf_counter()
+        weak = dict(KeyAudit.__batch_gcd(shards,workers))
+        Metrics.record("audit.batch_gcd_seconds",time.perf_counter()-start,{"moduli":len(values)})
+
+        for n, factor in weak.items():
+            shares = [other for other in weak if other != n and euclidean(n,other) != 1]
+            findings.append({
+                "finding":"shared factor",
+                "mod n":n,
+                "keys":moduli[n],
+                "factor":factor,
+                "shares with":[source for other in shares for source in moduli[other]] or shares
+            })
+        return findings
+
+    @staticmethod
+    def is_shared(sources):
+        """Whether the sources of a module are more keys, that share it.
+        The type is read from the end of each source, like "file (public key)": a private and a public key
+        are the 2 halves of a key pair, any other key (with or without a type) is one more key with the module.
+        Sources repeated more times (the same file given twice) are counted once.
+
+        Args:
+            sources (list): the sources of a module.
+
+        Returns:
+            bool: True if the module is shared by more keys.
+        """
+        sources = set(sources)
+        if len(sources) != 2:
+            return len(sources) > 2
+        types = sorted(source[source.rfind(" (")+2:-1] for source in sources if source.endswith(")") and " (" in source)
+        return types != ["private key","public key"]
+
+    @staticmethod
+    def __batch_gcd(shards,workers):
+        """The sharded batch GCD.
+
+        Args:
+            shards (list): the modules divided in shards.
+            workers (int): the number of processes.
+
+        Returns:
+            list: a (module, GCD) tuple for every module whose GCD with the product of the others is not 1.
+        """
+        if not workers or workers == 1 or len(shards) == 1:
+            products = [KeyAudit._shard_product(shard) for shard in shards]
+            KeyAudit._init_worker(products,Backend.name)
+            return [weak for shard in shards for weak in KeyAudit._audit_shard(shard)]
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as executor:
+            products = list(executor.map(KeyAudit._shard_product,shards))
+        with ProcessPoolExecutor(workers,initializer=KeyAudit._init_worker,initargs=(products,Backend.name)) as executor:
+            return [weak for result in executor.map(KeyAudit._audit_shard,shards) for weak in result]
+
+    @staticmethod
+    def _shard_product(shard):
+        """The product of the modules of a shard, it's run by the worker processes.
+        """
+        return int(product_tree(shard)[-1][0])
+
+    @staticmethod
+    def _init_worker(products,backend):
+        """Save the shards products in a worker process, it's the initializer of the process pool.
+        """
+        Backend.use(backend)
+        KeyAudit._products = [Backend.integer(product) for product in products]
+
+    @staticmethod
+    def _audit_shard(shard):
+        """Reduce the product of all the modules with the remainder tree of a shard, it's run by the worker processes.
+        The product of all the shards is calculated mod the square of the shard product,
+        so the number going down the tree is never bigger than the tree itself.
+
+        Args:
+            shard (list): the modules of the shard.
+
+        Returns:
+            list: a (module, GCD) tuple for every module of the shard whose GCD is not 1.
+        """
+        tree = product_tree(shard)
+        root = tree[-1][0]
+        square = root * root
+        total = Backend.integer(1)
+        for product in KeyAudit._products:
+            total = total * product % square
+        remainders = remainders_squared(tree,total)
+        weak = []
+        for n, remainder in zip(shard,remainders):
+            factor = Backend.gcd(remainder // n, n)
+            if factor != 1:
+                weak.append((n,int(factor)))
+        return weak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the RSA keys that share a prime factor, with the batch GCD.")
+    parser.add_argument("paths",nargs="*",help="key files or directories of keys")
+    parser.add_argument("--ring",action="append",default=[],help="a key ring file, it can be repeated")
+    parser.add_argument("--format",default="AUTO",help="the format of the key files, AUTO detects it")
+    parser.add_argument("-j","--workers",type=int,default=None,help="the number of processes")
+    parser.add_argument("--shard-size",type=int,default=KeyAudit.ShardSize,help="the number of modules in a shard")
+    args = parser.parse_args(argv)
+
+    sources = [KeyAudit.load_ring(ring) for ring in args.ring]
+    files = [path for path in args.paths if not os.path.isdir(path)]
+    sources += [KeyAudit.load_directory(path,args.format) for path in args.paths if os.path.isdir(path)]
+    sources.append(KeyAudit.load_files(files,args.format))
+    moduli = KeyAudit.merge(*sources)
+
+    start = time.perf_counter()
+    findings = KeyAudit.audit(moduli,args.workers,args.shard_size)
+    shared = sum(finding['finding'] == "shared modulus" for finding in findings)
+    print("%d modules checked in %.1f s, %d are shared by more keys, %d share a factor" % (
+        len(moduli),time.perf_counter()-start,shared,len(findings)-shared))
+    for finding in findings:
+        if finding['finding'] == "shared modulus":
+            print("%s share the same module" % ", ".join(finding['keys']))
+        else:
+            print("%s shares a factor with %s" % (", ".join(finding['keys']) or hex(finding['mod n']),", ".join(map(str,finding['shares with']))))
+    return 1 if findings else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
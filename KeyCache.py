@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import os
+import threading
+
+class KeyCache():
+    """
+    This class is an in-process LRU cache of the keys read from files.
+    A key is identified by its file path and format, and it's valid as long as
+    the file inode, size and modification time don't change.
+    So a repeated load of the same key costs only a stat call.
+
+    The cached dictionaries are shared, copy them before modifying them.
+    """
+
+    def __init__(self,maxsize=128):
+        """
+        Args:
+            maxsize (int, optional): the maximum number of keys kept in the cache. Defaults to 128.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def load(self,file_name,format,loader):
+        """Get a key from the cache, or load it and save it in the cache.
+
+        Args:
+            file_name (str): the file where the key is saved.
+            format (KeyFormat): the format the key is saved as.
+            loader (function): a function without arguments that reads the key from the file.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        entry = (os.path.abspath(file_name),format)
+        signature = KeyCache.__signature(file_name)
+        with self.__lock:
+            cached = self.__entries.get(entry)
+            if cached and cached[0] == signature:
+                self.__entries.move_to_end(entry)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        key = loader()
+        with self.__lock:
+            self.__entries[entry] = (signature,key)
+            self.__entries.move_to_end(entry)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+        return key
+
+    def evict(self,file_name=None,format=None):
+        """Remove keys from the cache.
+
+        Args:
+            file_name (str, optional): the file of the keys to remove, None removes every key. Defaults to None.
+            format (KeyFormat, optional): the format of the key to remove, None removes every format. Defaults to None.
+        """
+        with self.__lock:
+            if file_name is None:
+                self.__entries.clear()
+                return
+            path = os.path.abspath(file_name)
+            for entry in list(self.__entries):
+                if entry[0] == path and (format is None or entry[1] == format):
+                    del self.__entries[entry]
+
+    def resize(self,maxsize):
+        """Change the maximum number of keys kept in the cache.
+
+        Args:
+            maxsize (int): the maximum number of keys, 0 disables the cache.
+        """
+        with self.__lock:
+            self.maxsize = maxsize
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def info(self):
+        """The cache statistics.
+
+        Returns:
+            dict: the number of hits and misses, the number of keys in the cache and the maximum.
+        """
+        with self.__lock:
+            return {"hits":self.hits,"misses":self.misses,"size":len(self.__entries),"maxsize":self.maxsize}
+
+    @staticmethod
+    def __signature(file_name):
+        """The values that change when a file is replaced or modified.
+
+        Args:
+            file_name (str): the file name.
+
+        Returns:
+            tuple: the device, inode, size and modification time of the file.
+        """
+        stat = os.stat(file_name)
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
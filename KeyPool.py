@@ -0,0 +1,167 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import threading
+from RSA import RSA, KeyAlgorithm
+
+class KeyPool():
+    """
+    This class keeps a number of ready key pairs for each (bits, KeyAlgorithm) couple,
+    so that a key can be handed out immediately instead of waiting for gen_keys.
+    The pool is refilled by background processes: when the ready keys of a couple
+    drop below the low watermark new keys are generated until the high watermark is reached.
+    If no key is ready the key is generated synchronously.
+
+    The unissued keys can be saved to a file when the pool is closed, and loaded back when it's created.
+    The file is emptied as soon as it's loaded, so a key is never handed out twice.
+    The file contains private keys, so it's written readable only by its owner (0600).
+
+    Example:
+    > with KeyPool([(4096,KeyAlgorithm.LAMBDA)],persist_file="pool.json") as pool:
+    >     e,d,n,meta = pool.gen_keys(4096,"myname")
+    """
+
+    def __init__(self,sizes=((1024,KeyAlgorithm.LAMBDA),),low=2,high=8,workers=None,persist_file=None):
+        """
+        Args:
+            sizes (iterable, optional): the (bits, KeyAlgorithm) couples to keep ready. Defaults to ((1024,KeyAlgorithm.LAMBDA),).
+            low (int, optional): the number of ready keys under which the pool is refilled. Defaults to 2.
+            high (int, optional): the number of ready keys the pool is refilled to. Defaults to 8.
+            workers (int, optional): the number of background processes, None uses the number of CPUs. Defaults to None.
+            persist_file (str, optional): the file the unissued keys are saved to and loaded from. Defaults to None.
+        """
+        self.low = low
+        self.high = high
+        self.persist_file = persist_file
+        self.__ready = {(bits,algorithm):deque() for bits, algorithm in sizes}
+        self.__pending = {size:0 for size in self.__ready}
+        self.__lock = threading.Lock()
+        self.__executor = ProcessPoolExecutor(workers)
+        self.__closed = False
+        if persist_file:
+            self.__load()
+        for size in self.__ready:
+            self.__refill(size)
+
+    def gen_keys(self,bits=1024,name=None,algorithm=KeyAlgorithm.LAMBDA,crt=False):
+        """Hand out a ready key pair, it has the same arguments and results of RSA.gen_keys.
+        If no key is ready, or the (bits, algorithm) couple isn't in the pool, the key is generated synchronously.
+
+        Args:
+            bits (int, optional): the number of bits of the resulting key. Defaults to 1024.
+            name (str, optional): the name that's saved in the metadata. Defaults to None.
+            algorithm (KeyAlgorithm, optional): the function to be used. Defaults to KeyAlgorithm.LAMBDA.
+            crt (bool, optional): if True the CRT parameters are returned as a fifth value. Defaults to False.
+
+        Returns:
+            see RSA.gen_keys.
+        """
+        size = (bits,algorithm)
+        keys = None
+        with self.__lock:
+            if self.__ready.get(size):
+                keys = self.__ready[size].popleft()
+        if size in self.__ready:
+            self.__refill(size)
+        if keys is None:
+            keys = RSA.gen_keys(bits,None,algorithm,True)
+
+        e, d, n, metadata, crt_params = keys
+        metadata = dict(metadata, name=name)
+        if crt:
+            return e, d, n, metadata, crt_params
+        return e, d, n, metadata
+
+    def ready(self):
+        """The number of ready keys.
+
+        Returns:
+            dict: the number of ready keys for each (bits, KeyAlgorithm) couple.
+        """
+        with self.__lock:
+            return {size:len(keys) for size, keys in self.__ready.items()}
+
+    def close(self):
+        """Stop the background processes and, if persist_file is set, save the unissued keys.
+        """
+        with self.__lock:
+            self.__closed = True
+        self.__executor.shutdown(wait=True,cancel_futures=True)
+        if self.persist_file:
+            self.__save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __refill(self,size):
+        """Start generating keys in the background if the ready keys are below the low watermark.
+
+        Args:
+            size (tuple): the (bits, KeyAlgorithm) couple.
+        """
+        with self.__lock:
+            if self.__closed or len(self.__ready[size]) + self.__pending[size] >= self.low:
+                return
+            missing = self.high - len(self.__ready[size]) - self.__pending[size]
+            self.__pending[size] += missing
+        for _ in range(missing):
+            future = self.__executor.submit(RSA.gen_keys,size[0],None,size[1],True)
+            future.add_done_callback(lambda future, size=size: self.__generated(size,future))
+
+    def __generated(self,size,future):
+        """Add a key generated in the background to the ready ones.
+
+        Args:
+            size (tuple): the (bits, KeyAlgorithm) couple.
+            future (Future): the background generation.
+        """
+        with self.__lock:
+            self.__pending[size] -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.__ready[size].append(future.result())
+
+    def __save(self):
+        """Save the unissued keys to persist_file.
+        """
+        with self.__lock:
+            data = [
+                {"bits":bits,"algorithm":algorithm.name,"keys":list(keys)}
+                for (bits, algorithm), ready in self.__ready.items() for keys in ready
+            ]
+        KeyPool.__write(self.persist_file,data)
+
+    def __load(self):
+        """Load the unissued keys from persist_file, and empty the file.
+        """
+        if not os.path.exists(self.persist_file):
+            return
+        with open(self.persist_file,"r") as file:
+            data = json.load(file)
+        KeyPool.__write(self.persist_file,[])
+        for entry in data:
+            size = (entry['bits'],KeyAlgorithm[entry['algorithm']])
+            if size not in self.__ready:
+                self.__ready[size] = deque()
+                self.__pending[size] = 0
+            self.__ready[size].append(tuple(entry['keys']))
+
+    @staticmethod
+    def __write(file_name,data):
+        """Write the keys as JSON to a temporary file readable only by the owner (0600), and replace the file with it,
+        so the private keys are never readable by other users, and a crash leaves the old file.
+
+        Args:
+            file_name (str): the persist file.
+            data (list): the keys.
+        """
+        temp_name = file_name + ".tmp"
+        if os.path.exists(temp_name):
+            # a file left by a crash, it could have other permissions
+            os.remove(temp_name)
+        with os.fdopen(os.open(temp_name,os.O_WRONLY|os.O_CREAT|os.O_EXCL,0o600),"w") as file:
+            json.dump(data,file)
+        os.replace(temp_name,file_name)
@@ -0,0 +1,383 @@
+import json
+import mmap
+import os
+import struct
+from KeyIO import KeyFormat, key_fingerprint, crt_values, crt_from_values, DefaultMetadata
+from RSA import RSA
+
+InvalidKeyRing = Exception("Invalid key ring file")
+KeyNotFound = Exception("The key is not in the key ring")
+
+class KeyRing():
+    """
+    This class handles a key ring: a single binary file that contains many keys.
+    It's an alternative to saving every key in its own file with one of the KeyFormat formats.
+
+    The file is made of a header, the keys and an index, the header has the position of the index.
+    The keys integers are saved as fixed binary encodings (a 4 bytes length and the big endian bytes),
+    and the index keeps the name, fingerprint, type and position of each key.
+    When the key ring is opened only the index is read, the file is memory mapped and
+    a lookup by name or fingerprint decodes only the requested key.
+
+    When more keys have the same name (or fingerprint) and type a lookup returns the newest one.
+    Removed keys, and older copies of the same key, stay in the file until compact is called.
+    The file is only appended to: new keys and the new index are written after its end,
+    and the header is changed last, so if the process stops in the middle the old index is still valid.
+    The old indexes are removed by compact too, and append and remove call it by themselves
+    when the unused bytes are more than DeadShare of the file, so the file stays at most about twice the live data.
+
+    Example:
+    > with KeyRing("keys.ring") as ring:
+    >     ring.append(private)
+    >     key = ring.get_by_name("myname","private key")
+
+    Raises:
+        InvalidKeyRing: the file is not a key ring or it's damaged.
+        KeyNotFound: no key with the name or fingerprint.
+    """
+    Magic = b"RSAR"
+    Version = 1
+    # magic, version, index offset, number of keys in the index
+    Header = struct.Struct(">4sBQQ")
+    # fingerprint, offset, length, type, removed (after the name length and the name)
+    IndexRecord = struct.Struct(">32sQIBB")
+    Types = ("Unknown","public key","private key")
+    # the share of unused bytes (removed keys, older copies, old indexes) over which the file is compacted
+    DeadShare = 0.5
+    # smaller files are never compacted by append and remove
+    CompactMinSize = 64*1024
+
+    def __init__(self,file_name):
+        """Open a key ring, it's created if it doesn't exist.
+
+        Args:
+            file_name (str): the key ring file name.
+        """
+        self.file_name = file_name
+        if not os.path.exists(file_name):
+            with open(file_name,"wb") as file:
+                file.write(KeyRing.Header.pack(KeyRing.Magic,KeyRing.Version,KeyRing.Header.size,0))
+        self.__file = open(file_name,"r+b")
+        self.__map = None
+        self.__load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __len__(self):
+        return sum(1 for record in self.__records if not record['removed'])
+
+    def close(self):
+        """Close the key ring file.
+        """
+        if self.__map:
+            self.__map.close()
+            self.__map = None
+        self.__file.close()
+
+    def __iter__(self):
+        """Iterate over the keys that are not removed, oldest first.
+
+        Yields:
+            dict: a dictionary representing the key.
+        """
+        for record in self.__records:
+            if not record['removed']:
+                yield self.__decode(record)
+
+    def names(self):
+        """The names of the keys in the key ring.
+
+        Returns:
+            list: the names, without duplicates.
+        """
+        return [name for name, indexes in self.__by_name.items() if any(not self.__records[i]['removed'] for i in indexes)]
+
+    def get_by_name(self,name,type=None):
+        """Find a key by its metadata name.
+
+        Args:
+            name (str): the key name.
+            type (str, optional): "private key", "public key" or "Unknown", None means any type. Defaults to None.
+
+        Raises:
+            KeyNotFound: no key with the name.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        return self.__decode(self.__find(self.__by_name.get(name,[]),type))
+
+    def get_by_fingerprint(self,fingerprint,type=None):
+        """Find a key by its fingerprint (see KeyIO.key_fingerprint).
+
+        Args:
+            fingerprint (bytes | str): the fingerprint, as bytes or as an hex string.
+            type (str, optional): "private key", "public key" or "Unknown", None means any type. Defaults to None.
+
+        Raises:
+            KeyNotFound: no key with the fingerprint.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        if isinstance(fingerprint,str):
+            fingerprint = bytes.fromhex(fingerprint)
+        return self.__decode(self.__find(self.__by_fingerprint.get(fingerprint,[]),type))
+
+    def append(self,*keys):
+        """Add keys to the key ring.
+
+        Args:
+            keys (dict): the dictionaries representing the keys.
+        """
+        offset = self.__file.seek(0,os.SEEK_END)
+        for key in keys:
+            entry = KeyRing.__encode(key)
+            self.__file.write(entry)
+            self.__add_record(KeyRing.__name(key),key_fingerprint(key),offset,len(entry),KeyRing.__type_code(key['type']),False)
+            offset += len(entry)
+        self.__write_index()
+        self.__auto_compact()
+
+    def remove(self,name=None,fingerprint=None,type=None):
+        """Remove the keys with a name or a fingerprint, the space is freed by compact.
+
+        Args:
+            name (str, optional): the keys name. Defaults to None.
+            fingerprint (bytes | str, optional): the keys fingerprint. Defaults to None.
+            type (str, optional): remove only the keys of this type, None means any type. Defaults to None.
+
+        Returns:
+            int: the number of keys removed.
+        """
+        if isinstance(fingerprint,str):
+            fingerprint = bytes.fromhex(fingerprint)
+        indexes = self.__by_name.get(name,[]) if name is not None else self.__by_fingerprint.get(fingerprint,[])
+        removed = 0
+        for i in indexes:
+            record = self.__records[i]
+            if not record['removed'] and (type is None or KeyRing.Types[record['type']] == type):
+                record['removed'] = True
+                removed += 1
+        if removed:
+            self.__write_index()
+            self.__auto_compact()
+        return removed
+
+    def compact(self):
+        """Rewrite the key ring without the removed keys, the older copies of the same key and the old indexes.
+        """
+        temp_name = self.file_name + ".tmp"
+        with open(temp_name,"wb") as temp:
+            temp.write(KeyRing.Header.pack(KeyRing.Magic,KeyRing.Version,0,0))
+            records = []
+            offset = KeyRing.Header.size
+            for record in self.__live_records():
+                record = dict(record)
+                temp.write(self.__map[record['offset']:record['offset']+record['length']])
+                record['offset'] = offset
+                offset += record['length']
+                records.append(record)
+            temp.write(KeyRing.__pack_index(records))
+            temp.seek(0)
+            temp.write(KeyRing.Header.pack(KeyRing.Magic,KeyRing.Version,offset,len(records)))
+            temp.flush()
+            os.fsync(temp.fileno())
+
+        self.close()
+        os.replace(temp_name,self.file_name)
+        self.__file = open(self.file_name,"r+b")
+        self.__load()
+
+    def import_files(self,file_names,format=KeyFormat.ASCII):
+        """Add the keys saved in files to the key ring.
+
+        Args:
+            file_names (iterable): the files where the keys are saved.
+            format (KeyFormat, optional): the format the keys are saved as. Defaults to KeyFormat.ASCII.
+
+        Returns:
+            int: the number of keys added.
+        """
+        keys = [RSA.readKey(file_name,format,cache=False) for file_name in file_names]
+        self.append(*keys)
+        return len(keys)
+
+    def __load(self):
+        """Read the header and the index, and memory map the file.
+
+        Raises:
+            InvalidKeyRing: the file is not a key ring or it's damaged.
+        """
+        self.__map = mmap.mmap(self.__file.fileno(),0,access=mmap.ACCESS_READ)
+        if len(self.__map) < KeyRing.Header.size:
+            raise InvalidKeyRing
+        magic, version, self.__index_offset, count = KeyRing.Header.unpack_from(self.__map,0)
+        if magic != KeyRing.Magic or version != KeyRing.Version or self.__index_offset > len(self.__map):
+            raise InvalidKeyRing
+
+        self.__records = []
+        self.__by_name = {}
+        self.__by_fingerprint = {}
+        position = self.__index_offset
+        try:
+            for _ in range(count):
+                name_len, = struct.unpack_from(">H",self.__map,position)
+                position += 2
+                name = bytes(self.__map[position:position+name_len]).decode('utf-8')
+                position += name_len
+                fingerprint, offset, length, type, removed = KeyRing.IndexRecord.unpack_from(self.__map,position)
+                position += KeyRing.IndexRecord.size
+                self.__add_record(name,fingerprint,offset,length,type,bool(removed))
+        except struct.error:
+            raise InvalidKeyRing
+
+    def __live_records(self):
+        """The records compact keeps: the newest copy of each key that is not removed, oldest first.
+        """
+        latest = {}
+        for i, record in enumerate(self.__records):
+            if not record['removed']:
+                latest[(record['name'],record['fingerprint'],record['type'])] = i
+        return [self.__records[i] for i in sorted(latest.values())]
+
+    def __auto_compact(self):
+        """Compact the file if it's bigger than CompactMinSize and more than DeadShare of it is unused.
+        """
+        size = len(self.__map)
+        if size < KeyRing.CompactMinSize:
+            return
+        records = self.__live_records()
+        # each index record is the name length, the name and an IndexRecord
+        live = KeyRing.Header.size + sum(record['length'] + 2 + len(record['name'].encode('utf-8')) + KeyRing.IndexRecord.size for record in records)
+        if size - live > KeyRing.DeadShare * size:
+            self.compact()
+
+    def __add_record(self,name,fingerprint,offset,length,type,removed):
+        """Add a key to the in memory index.
+        """
+        self.__records.append({"name":name,"fingerprint":fingerprint,"offset":offset,"length":length,"type":type,"removed":removed})
+        self.__by_name.setdefault(name,[]).append(len(self.__records)-1)
+        self.__by_fingerprint.setdefault(fingerprint,[]).append(len(self.__records)-1)
+
+    def __write_index(self):
+        """Write the index at the end of the file, then the header, and map the file again.
+        The header is written only when the index is on the disk, until then it points to the old index.
+        """
+        if self.__map:
+            self.__map.close()
+        index_offset = self.__file.seek(0,os.SEEK_END)
+        self.__file.write(KeyRing.__pack_index(self.__records))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__index_offset = index_offset
+        self.__file.seek(0)
+        self.__file.write(KeyRing.Header.pack(KeyRing.Magic,KeyRing.Version,self.__index_offset,len(self.__records)))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__map = mmap.mmap(self.__file.fileno(),0,access=mmap.ACCESS_READ)
+
+    def __find(self,indexes,type):
+        """The last key among the indexes that is not removed and has the type.
+
+        Raises:
+            KeyNotFound: no such key.
+        """
+        for i in reversed(indexes):
+            record = self.__records[i]
+            if not record['removed'] and (type is None or KeyRing.Types[record['type']] == type):
+                return record
+        raise KeyNotFound
+
+    def __decode(self,record):
+        """Decode a key from the memory mapped file.
+
+        Args:
+            record (dict): the index record of the key.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        data = memoryview(self.__map)[record['offset']:record['offset']+record['length']]
+        try:
+            type, count = struct.unpack_from(">BH",data,0)
+            position = 3
+            values = []
+            for _ in range(count+1):
+                length, = struct.unpack_from(">I",data,position)
+                position += 4
+                values.append(bytes(data[position:position+length]))
+                position += length
+        except struct.error:
+            raise InvalidKeyRing
+        finally:
+            data.release()
+
+        metadata = json.loads(values.pop().decode('utf-8'))
+        values = [int.from_bytes(value,"big") for value in values]
+        key = {
+            "type":KeyRing.Types[type],
+            "key exponent":values[0],
+            "mod n":values[1],
+            "metadata":metadata
+        }
+        crt = crt_from_values(values[2:])
+        if crt:
+            key['crt'] = crt
+        return key
+
+    @staticmethod
+    def __encode(key):
+        """Encode a key: the type, the number of integers, the integers and the metadata as JSON,
+        each one with a 4 bytes length.
+
+        Args:
+            key (dict): a dictionary representing the key.
+
+        Returns:
+            bytes: the encoded key.
+        """
+        values = [key['key exponent'],key['mod n']]
+        if 'crt' in key:
+            values += crt_values(key['crt'])
+        metadata = key['metadata'] if isinstance(key['metadata'],dict) else DefaultMetadata
+        fields = [value.to_bytes((value.bit_length()+7)//8,"big") for value in values]
+        fields.append(json.dumps(metadata,ensure_ascii=False).encode('utf-8'))
+        entry = struct.pack(">BH",KeyRing.__type_code(key['type']),len(values))
+        return entry + b''.join(struct.pack(">I",len(field)) + field for field in fields)
+
+    @staticmethod
+    def __pack_index(records):
+        """Encode the index.
+
+        Args:
+            records (list): the index records.
+
+        Returns:
+            bytes: the encoded index.
+        """
+        index = []
+        for record in records:
+            name = record['name'].encode('utf-8')
+            index.append(struct.pack(">H",len(name)) + name + KeyRing.IndexRecord.pack(
+                record['fingerprint'],record['offset'],record['length'],record['type'],record['removed']
+            ))
+        return b''.join(index)
+
+    @staticmethod
+    def __name(key):
+        """The metadata name of a key, or "Unknown".
+        """
+        if isinstance(key['metadata'],dict) and key['metadata'].get('name'):
+            return str(key['metadata']['name'])
+        return "Unknown"
+
+    @staticmethod
+    def __type_code(type):
+        """The number that represent a key type in the file.
+        """
+        return KeyRing.Types.index(type) if type in KeyRing.Types else 0
@@ -0,0 +1,128 @@
+import threading
+import time
+from functools import wraps
+
+class Metrics():
+    """
+    This class collects the metrics of the other modules: RSACrypt (blocks, bytes, exponentiation time),
+    RSA.gen_keys (time per prime, exponent retries), PrimeSieve (candidates, sieve hits, full tests)
+    and KeyIO (parse and serialize time per format).
+    It's disabled by default, and while it's disabled the instrumented code only checks Metrics.enabled.
+
+    Every metric is a summary: the sum of the recorded values and the number of records,
+    optionally divided by labels (for example the key format).
+    Each record is also sent to the sinks, functions called as sink(name, value, labels).
+
+    Example:
+    > Metrics.enable(lambda name, value, labels: print(name, value, labels))
+    > RSACrypt.crypt_string(key,"message")
+    > print(Metrics.prometheus())
+    This class has only static methods.
+    """
+    enabled = False
+    __sinks = []
+    __summaries = {}
+    __lock = threading.Lock()
+
+    @staticmethod
+    def enable(*sinks):
+        """Start collecting metrics.
+
+        Args:
+            sinks (function): functions called as sink(name, value, labels) on every record.
+        """
+        with Metrics.__lock:
+            Metrics.__sinks.extend(sinks)
+        Metrics.enabled = True
+
+    @staticmethod
+    def disable():
+        """Stop collecting metrics and remove the sinks, the collected values are kept.
+        """
+        Metrics.enabled = False
+        with Metrics.__lock:
+            Metrics.__sinks.clear()
+
+    @staticmethod
+    def reset():
+        """Remove the collected values.
+        """
+        with Metrics.__lock:
+            Metrics.__summaries.clear()
+
+    @staticmethod
+    def record(name,value,labels=None):
+        """Record a value, it does nothing if the metrics are disabled.
+
+        Args:
+            name (str): the metric name.
+            value (float): the value.
+            labels (dict, optional): the labels of the value. Defaults to None.
+        """
+        if not Metrics.enabled:
+            return
+        key = (name,tuple(sorted(labels.items())) if labels else ())
+        with Metrics.__lock:
+            summary = Metrics.__summaries.setdefault(key,[0,0])
+            summary[0] += value
+            summary[1] += 1
+            sinks = list(Metrics.__sinks)
+        for sink in sinks:
+            sink(name,value,labels or {})
+
+    @staticmethod
+    def timed(name,**labels):
+        """A decorator that records the seconds a function takes, when the metrics are enabled.
+
+        Args:
+            name (str): the metric name.
+            labels (str): the labels of the value.
+
+        Returns:
+            function: the decorator.
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args,**kwargs):
+                if not Metrics.enabled:
+                    return function(*args,**kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args,**kwargs)
+                finally:
+                    Metrics.record(name,time.perf_counter()-start,labels)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def snapshot():
+        """The collected values.
+
+        Returns:
+            dict: for every (name, labels) couple, a dictionary with the sum and the count.
+        """
+        with Metrics.__lock:
+            return {key:{"sum":summary[0],"count":summary[1]} for key, summary in Metrics.__summaries.items()}
+
+    @staticmethod
+    def prometheus(prefix="rsa_"):
+        """Export the collected values in the Prometheus text format, each metric as a summary.
+
+        Args:
+            prefix (str, optional): the prefix added to the metrics names. Defaults to "rsa_".
+
+        Returns:
+            str: the metrics.
+        """
+        lines = []
+        typed = set()
+        for (name, labels), summary in sorted(Metrics.snapshot().items()):
+            metric = prefix + name.replace(".","_")
+            if metric not in typed:
+                typed.add(metric)
+                lines.append("# TYPE %s summary" % metric)
+            label_text = ",".join('%s="%s"' % (label,str(value).replace('"','\\"')) for label, value in labels)
+            label_text = "{%s}" % label_text if label_text else ""
+            lines.append("%s_sum%s %r" % (metric,label_text,float(summary['sum'])))
+            lines.append("%s_count%s %d" % (metric,label_text,summary['count']))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,180 @@
+import time
+from Crypto.Random import get_random_bytes
+from Backend import Backend
+from Metrics import Metrics
+
+class PrimeSieve():
+    """
+    This class generates random primes with an incremental sieve, an alternative to getPrime
+    (choose it in RSA.gen_keys with PrimeGenerator.SIEVE).
+
+    A random odd start is chosen, and the window of the next WindowFactor*bits odd numbers is sieved
+    with the primes smaller than SieveLimit: their multiples are crossed out all together with slice assignments,
+    so most composites are discarded without a single exponentiation.
+    Only the numbers left get the Miller-Rabin test, the first one with base 2 (it rejects almost every composite)
+    and then the other rounds with random bases. If the window has no prime the next window is sieved.
+
+    The candidates (the numbers in the windows that were looked at), the sieve hits (the candidates crossed out)
+    and the full tests (the Miller-Rabin tests started) are counted, in a dictionary and in the Metrics.
+
+    Example:
+    > counters = {}
+    > p = PrimeSieve.get_prime(1024, rounds=10, counters=counters)
+    This class has only static methods.
+    """
+    # the primes smaller than this sieve the windows
+    SieveLimit = 2**18
+    # the length of a window is WindowFactor*bits odd numbers, a few times the average distance between primes
+    WindowFactor = 4
+    # (bits, rounds): the Miller-Rabin rounds used when they are not given, for random candidates
+    # an error probability below 2^-100 needs less rounds the longer the prime is
+    Rounds = ((1536,4),(1024,5),(512,8),(256,15),(0,40))
+    __small_primes = None
+
+    @staticmethod
+    def get_prime(bits,rounds=None,counters=None):
+        """Generate a random prime.
+
+        Args:
+            bits (int): the length in bits of the prime, the highest bit is always set.
+            rounds (int, optional): the Miller-Rabin rounds. Defaults to the Rounds of the length.
+            counters (dict, optional): a dictionary where the "candidates", "sieve hits" and "full tests" are added. Defaults to None.
+
+        Raises:
+            ValueError: bits is smaller than 2.
+
+        Returns:
+            int: the prime.
+        """
+        if bits < 2:
+            # the same exception of getPrime
+            raise ValueError("N must be larger than 1")
+        if rounds is None:
+            rounds = PrimeSieve.rounds(bits)
+        start_time = time.perf_counter()
+        counts = {"candidates":0,"sieve hits":0,"full tests":0}
+        high = 1 << bits
+
+        prime = None
+        start = PrimeSieve.__random_start(bits)
+        while prime is None:
+            # the window can't go over the length, then a new random start is taken
+            length = min(PrimeSieve.WindowFactor*bits,(high-start+1)//2)
+            if length <= 0:
+                start = PrimeSieve.__random_start(bits)
+                continue
+            sieve = PrimeSieve.sieve(start,length)
+            tests = 0
+            index = sieve.find(1)
+            while index != -1:
+                number = start + 2*index
+                if number < PrimeSieve.SieveLimit**2:
+                    # it has no factor smaller than its square root
+                    prime = number
+                    break
+                tests += 1
+                if PrimeSieve.miller_rabin(number,rounds):
+                    prime = number
+                    break
+                index = sieve.find(1,index+1)
+            examined = length if prime is None else index + 1
+            counts["candidates"] += examined
+            counts["full tests"] += tests
+            counts["sieve hits"] += examined - sieve.count(1,0,examined)
+            start += 2*length
+
+        if counters is not None:
+            for name, value in counts.items():
+                counters[name] = counters.get(name,0) + value
+        if Metrics.enabled:
+            Metrics.record("primes.candidates",counts["candidates"])
+            Metrics.record("primes.sieve_hits",counts["sieve hits"])
+            Metrics.record("primes.full_tests",counts["full tests"])
+            Metrics.record("primes.seconds",time.perf_counter()-start_time)
+        return prime
+
+    @staticmethod
+    def sieve(start,length):
+        """Sieve the odd numbers start, start+2, ..., start+2*(length-1) with the small primes.
+
+        Args:
+            start (int): an odd number.
+            length (int): the number of odd numbers.
+
+        Returns:
+            bytearray: 1 for every number with no factor in the small primes (the small primes themselves too), 0 for the others.
+        """
+        sieve = bytearray(b"\x01") * length
+        for p in PrimeSieve.small_primes():
+            # start + 2*i = 0 mod p  =>  i = -start / 2 mod p, and (p+1)//2 is the inverse of 2
+            first = (-start % p) * ((p+1)//2) % p
+            if start + 2*first == p:
+                # p itself is not crossed out
+                first += p
+            if first < length:
+                sieve[first::p] = bytes(len(range(first,length,p)))
+        return sieve
+
+    @staticmethod
+    def miller_rabin(n,rounds):
+        """The Miller-Rabin test, the first base is 2 and the others are random.
+
+        Args:
+            n (int): an odd number bigger than 4.
+            rounds (int): the number of bases tried.
+
+        Returns:
+            bool: True if n is a probable prime, False if it's composite.
+        """
+        d = n - 1
+        shift = (d & -d).bit_length() - 1
+        d >>= shift
+        for round in range(rounds):
+            base = 2 if round == 0 else int.from_bytes(get_random_bytes((n.bit_length()+7)//8),"big") % (n-3) + 2
+            x = Backend.powmod(base,d,n)
+            if x == 1 or x == n-1:
+                continue
+            for _ in range(shift-1):
+                x = Backend.powmod(x,2,n)
+                if x == n-1:
+                    break
+            else:
+                return False
+        return True
+
+    @staticmethod
+    def rounds(bits):
+        """The Miller-Rabin rounds used for a length when they are not given.
+
+        Args:
+            bits (int): the length in bits of the prime.
+
+        Returns:
+            int: the rounds.
+        """
+        for length, rounds in PrimeSieve.Rounds:
+            if bits >= length:
+                return rounds
+
+    @staticmethod
+    def small_primes():
+        """The odd primes smaller than SieveLimit (the windows have only odd numbers), calculated once.
+
+        Returns:
+            tuple: the primes.
+        """
+        if PrimeSieve.__small_primes is None:
+            limit = PrimeSieve.SieveLimit
+            flags = bytearray(b"\x01") * limit
+            for p in range(3,int(limit**0.5)+1,2):
+                if flags[p]:
+                    flags[p*p::2*p] = bytes(len(range(p*p,limit,2*p)))
+            PrimeSieve.__small_primes = tuple(p for p in range(3,limit,2) if flags[p])
+        return PrimeSieve.__small_primes
+
+    @staticmethod
+    def __random_start(bits):
+        """A random odd number of the given length, with the highest bit set.
+        """
+        number = int.from_bytes(get_random_bytes((bits+7)//8),"big") >> (-bits % 8)
+        return number | (1 << (bits-1)) | 1
@@ -1,9 +1,14 @@
-from Crypto.Util.number import getPrime, inverse
-from Crypto.Random import get_random_bytes
 from enum import Enum
+import os
 import random
+import time
 from euclidean_algorithm import *
-from KeyIO import KeyFormat,KeyReader,KeyWriter
+from Backend import Backend
+from KeyIO import KeyFormat,KeyReader,KeyWriter,KeyCodecs,UnknownFormat
+from KeyCache import KeyCache
+from Metrics import Metrics
+from PrimeSieve import PrimeSieve
+# concurrent.futures and multiprocessing are imported only by the methods that use more processes
 
 class KeyAlgorithm(Enum):
     """This Enum containg the types of funcion used in the algorithm to generate the rsa keys.
@@ -11,18 +16,36 @@ class KeyAlgorithm(Enum):
     PHI="Euler totient function φ(n)"
     LAMBDA="Carmichael function λ(n)"
 
+class ExponentPolicy(Enum):
+    """This Enum containg the ways the encryption exponent e can be chosen.
+    A small e makes the public key operations much faster than a random one as long as n.
+    """
+    FIXED=65537                         # e = 65537, if it's not coprime with λ(n) or φ(n) new primes are generated
+    SMALL_PRIMES=(65537,257,17,5,3)     # the first of these primes that is coprime with λ(n) or φ(n)
+    RANDOM="random"                     # a random e between 3 and λ(n) or φ(n)
+
+class PrimeGenerator(Enum):
+    """This Enum containg the ways the primes p and q can be generated.
+    """
+    BACKEND="backend"                   # Backend.get_prime: pycryptodome getPrime, or gmpy2.next_prime
+    SIEVE="sieve"                       # PrimeSieve.get_prime: an incremental sieve, then the Miller-Rabin test
+
 class RSA():
     """This class handles the creation of keys.
     It also translate the keys in the dictionary used by all the others modules. 
 
     Raises:
         RSA.InvalidAlgorithm: invalid function used in the algorithm.
+        RSA.InvalidExponent: an int exponent is even or smaller than 3.
     """
     InvalidAlgorithm = Exception("Invalid Algorith for RSA")
+    InvalidExponent = Exception("The encryption exponent must be odd and at least 3")
     DefaultMetadata = {"name":"Unknown","algorithm":"Unknown","length":"Unknown"}
+    # the keys already read by readKey and readKeys
+    Cache = KeyCache()
 
     @staticmethod
-    def gen_keys(bits=1024, name=None, algorithm=KeyAlgorithm.LAMBDA):
+    def gen_keys(bits=1024, name=None, algorithm=KeyAlgorithm.LAMBDA, crt=False, workers=None, exponent=ExponentPolicy.RANDOM, primes=2, generator=PrimeGenerator.BACKEND):
         """This method generates a RSA keys couple.
         See https://en.wikipedia.org/wiki/RSA_(cryptosystem)#Key_generation
         for more information.
@@ -31,59 +54,176 @@ class RSA():
             bits (int, optional): the number of bits of the resulting key. Defaults to 1024.
             name (str, optional): the name that's saved in the metadata. Defaults to None.
             algorithm (KeyAlgorithm, optional): the function to be used. Defaults to KeyAlgorithm.LAMBDA.
+            crt (bool, optional): if True the CRT parameters are returned as a fifth value. Defaults to False.
+            workers (int, optional): if greater than 1, p and q are searched at the same time by exactly this many processes. Defaults to None.
+            exponent (ExponentPolicy | int, optional): how the encryption exponent is chosen, an int is used as a fixed exponent. Defaults to ExponentPolicy.RANDOM.
+            primes (int, optional): the number of prime factors of n, with more primes each one is smaller
+                                    and both the generation and the CRT decryption are faster. Defaults to 2.
+            generator (PrimeGenerator, optional): how the primes are generated. Defaults to PrimeGenerator.BACKEND.
 
         Raises:
             RSA.InvalidAlgorithm: invalid function used in the algorithm.
+            RSA.InvalidExponent: an int exponent is even or smaller than 3.
+            ValueError: primes is not an int of at least 2.
 
         Returns:
             encryption_exponent (int): the exponent to be used to encrypt.
             decryption_exponent (int): the exponent to be used to decrypt.
             module_n            (int): the module n to be used in encryption/decryption.
             metadata            (dict): a dictionary containg the key metadata.
+            crt                 (dict): only if crt is True, the CRT parameters (see makeCRT).
         """
+        if not isinstance(primes, int) or isinstance(primes, bool) or primes < 2:
+            raise ValueError("primes must be an int of at least 2")
         metadata = {"name":name,"algorithm":{algorithm.name:algorithm.value},"length":bits}
 
         if(not name):
             name = RSA.__get_random_string()
 
-        p_len_in_bits, q_len_in_bits = RSA.__divide_bits(bits,name)
+        lengths_in_bits = RSA.__divide_bits(bits,name,primes)
 
-        prime1_p = getPrime(
-           p_len_in_bits,
-           get_random_bytes 
-        )
-        prime2_q = getPrime(
-           q_len_in_bits,
-           get_random_bytes 
-        )
-
-        module_n = prime1_p*prime2_q
-
-        if (algorithm == KeyAlgorithm.LAMBDA):
-            # λ(n) = lcm(p-1,q-1), lcm(a,b) = |ab|/GCD(a,b)
-            f_di_n = (prime1_p-1)*(prime2_q-1)//euclidean(prime1_p-1,prime2_q-1)
-        elif (algorithm == KeyAlgorithm.PHI):
-            f_di_n = (prime1_p-1)*(prime2_q-1)
-        else:
+        if algorithm not in (KeyAlgorithm.LAMBDA, KeyAlgorithm.PHI):
             raise RSA.InvalidAlgorithm
-        
+        if not isinstance(exponent, ExponentPolicy) and (exponent < 3 or exponent % 2 == 0):
+            # λ(n) and φ(n) are always even, an even e would make new primes be generated forever
+            raise RSA.InvalidExponent
+
         gcd = None
+        rounds = 0
         while gcd != 1:
-            # e and λ(n) or φ(n) must be cooprimes
-            encryption_exponent = random.randint(3,f_di_n)
-            # the extended auclidean algorith also calculate th inverse of e mod λ(n) or φ(n)
-            gcd, decryption_exponent, _ = extended_euclidean(encryption_exponent, f_di_n)
-        
-        while decryption_exponent < 0:
-            decryption_exponent += f_di_n
+            rounds += 1
+            if workers and workers > 1 and min(lengths_in_bits) > 1:
+                factors = RSA.__parallel_primes(lengths_in_bits, workers, generator)
+            else:
+                factors = [RSA.__get_prime(length, generator) for length in lengths_in_bits]
+            if primes > 2:
+                RSA.__fit_last_prime(factors, bits, generator)
+            if len(set(factors)) != len(factors):
+                # the primes must be different
+                gcd = None
+                continue
+
+            module_n = 1
+            f_di_n = 1
+            for prime in factors:
+                module_n *= prime
+                if (algorithm == KeyAlgorithm.LAMBDA):
+                    # λ(n) = lcm(p-1,q-1,...), lcm(a,b) = |ab|/GCD(a,b)
+                    f_di_n = f_di_n*(prime-1)//euclidean(f_di_n,prime-1)
+                else:
+                    f_di_n *= prime-1
+
+            # e and λ(n) or φ(n) must be cooprimes,
+            # if no e allowed by the policy is, new primes are generated
+            gcd, encryption_exponent, decryption_exponent = RSA.__choose_exponent(exponent, f_di_n)
+
+        # the times new primes were generated, because of the exponent policy or of duplicated primes
+        Metrics.record("gen_keys.prime_retries", rounds-1)
+
+        if crt:
+            return encryption_exponent, decryption_exponent, module_n, metadata, RSA.makeCRT(decryption_exponent, *factors)
+        return encryption_exponent, decryption_exponent, module_n, metadata
 
-        # this function can also be used to calculate the inverse
-        # decryption_exponent = inverse(encryption_exponent,f_di_n)
+    @staticmethod
+    def gen_keys_batch(count, bits=1024, algorithm=KeyAlgorithm.LAMBDA, workers=None, directory=None, format=KeyFormat.ASCII,
+                       name_format="key{index}", crt=False, exponent=ExponentPolicy.RANDOM, stats=None, primes=2, generator=PrimeGenerator.BACKEND):
+        """Generate many key pairs at once, dividing them between processes.
+        This is a generator, each key pair is yielded as soon as it's ready, so not in order.
+        The name of the key number i is name_format.format(index=i), and if a directory is given
+        the keys are written to <directory>/<name>_priv.key and <directory>/<name>_pub.key.
 
-        return encryption_exponent, decryption_exponent, module_n, metadata
+        Args:
+            count (int): the number of key pairs.
+            bits (int, optional): the number of bits of the keys. Defaults to 1024.
+            algorithm (KeyAlgorithm, optional): the function to be used. Defaults to KeyAlgorithm.LAMBDA.
+            workers (int, optional): the number of processes, None uses the number of CPUs. Defaults to None.
+            directory (str, optional): the directory the keys are written to, None doesn't write them. Defaults to None.
+            format (KeyFormat, optional): the format the keys are written as. Defaults to KeyFormat.ASCII.
+            name_format (str, optional): the name of the keys, {index} is replaced with the key number. Defaults to "key{index}".
+            crt (bool, optional): if True the CRT parameters are generated and written too. Defaults to False.
+            exponent (ExponentPolicy | int, optional): how the encryption exponent is chosen. Defaults to ExponentPolicy.RANDOM.
+            stats (dict, optional): a dictionary that's filled with the throughput (see batch_stats) when the generation ends. Defaults to None.
+            primes (int, optional): the number of prime factors of n. Defaults to 2.
+            generator (PrimeGenerator, optional): how the primes are generated. Defaults to PrimeGenerator.BACKEND.
+
+        Yields:
+            (int,tuple): the key number and the gen_keys result.
+        """
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        jobs = [
+            (index, bits, name_format.format(index=index), algorithm, crt, exponent, directory, format, primes, generator)
+            for index in range(count)
+        ]
+
+        latencies = []
+        start = time.perf_counter()
+        if workers == 1:
+            for job in jobs:
+                index, keys, latency = RSA._gen_keys_job(*job)
+                latencies.append(latency)
+                yield index, keys
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(RSA._gen_keys_job, *job) for job in jobs]
+                for future in as_completed(futures):
+                    index, keys, latency = future.result()
+                    latencies.append(latency)
+                    yield index, keys
+
+        if stats is not None:
+            stats.update(RSA.batch_stats(latencies, time.perf_counter() - start))
 
     @staticmethod
-    def writeAndMakeKeys(e,d,n,metadata=None, format=KeyFormat.ASCII,priv_file_name="priv.key",pub_file_name="pub.key"):
+    def batch_stats(latencies, elapsed):
+        """Calculate the throughput of a key generation batch.
+
+        Args:
+            latencies (list): the seconds taken by each key pair.
+            elapsed (float): the seconds taken by the whole batch.
+
+        Returns:
+            dict: the number of keys, the seconds, the keys per second and the p50, p90, p99 and max latency in seconds.
+        """
+        latencies = sorted(latencies)
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            # nearest-rank percentile
+            return latencies[max(0, -(-p * len(latencies) // 100) - 1)]
+        return {
+            "keys":len(latencies),
+            "seconds":elapsed,
+            "keys per second":len(latencies) / elapsed if elapsed else 0.0,
+            "latency":{"p50":percentile(50), "p90":percentile(90), "p99":percentile(99), "max":percentile(100)}
+        }
+
+    @staticmethod
+    def _gen_keys_job(index, bits, name, algorithm, crt, exponent, directory, format, primes, generator):
+        """Generate, and write if a directory is given, a key pair of a gen_keys_batch batch.
+
+        Args:
+            see gen_keys_batch.
+
+        Returns:
+            (int,tuple,float): the key number, the gen_keys result and the seconds it took.
+        """
+        start = time.perf_counter()
+        keys = RSA.gen_keys(bits, name, algorithm, crt, exponent=exponent, primes=primes, generator=generator)
+        latency = time.perf_counter() - start
+        if directory:
+            e, d, n, metadata = keys[:4]
+            RSA.writeAndMakeKeys(
+                e, d, n, metadata, format,
+                os.path.join(directory, name + "_priv.key"),
+                os.path.join(directory, name + "_pub.key"),
+                keys[4] if crt else None
+            )
+        return index, keys, latency
+
+    @staticmethod
+    def writeAndMakeKeys(e,d,n,metadata=None, format=KeyFormat.ASCII,priv_file_name="priv.key",pub_file_name="pub.key",crt=None):
         """Produce 2 dictionaries representing the keys, and writes them to a file.
 
         Args:
@@ -94,11 +234,12 @@ class RSA():
             format (KeyFormat, optional): the format the files will be. Defaults to KeyFormat.ASCII.
             priv_file_name (str, optional): the name of the private key file. Defaults to "priv.key".
             pub_file_name (str, optional): the name of the public key file. Defaults to "pub.key".
+            crt (dict, optional): the CRT parameters of the private key (see makeCRT). Defaults to None.
 
         Returns:
             (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
         """
-        keys = RSA.makeKeys(e,d,n,metadata)
+        keys = RSA.makeKeys(e,d,n,metadata,crt)
         return RSA.writeKeys(keys,format,priv_file_name,pub_file_name)
 
     @staticmethod
@@ -126,7 +267,7 @@ class RSA():
 
         Args:
             keys (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
-            format (KeyFormat, optional): the format the keys will be saved as. Defaults to KeyFormat.ASCII.
+            format (KeyFormat | str, optional): the format the keys will be saved as. Defaults to KeyFormat.ASCII.
             priv_file_name (str, optional): the private key file name. Defaults to "priv.key".
             pub_file_name (str, optional): the public key file name. Defaults to "pub.key".
 
@@ -134,22 +275,12 @@ class RSA():
             (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
         """
         priv_key, pub_key = keys
+        write = KeyCodecs.writer(format)
         with open(priv_file_name,"w") as priv_file, open(pub_file_name,"w") as pub_file:
-            if(format == KeyFormat.JSON):
-                KeyWriter.write_json(priv_key,priv_file)
-                KeyWriter.write_json(pub_key,pub_file)
-            elif (format == KeyFormat.YML):
-                KeyWriter.write_yml(priv_key,priv_file)
-                KeyWriter.write_yml(pub_key,pub_file)
-            elif (format == KeyFormat.RAW):
-                KeyWriter.write_raw(priv_key,priv_file)
-                KeyWriter.write_raw(pub_key,pub_file)
-            elif (format == KeyFormat.ASCII):
-                KeyWriter.write_ascii(priv_key,priv_file)
-                KeyWriter.write_ascii(pub_key,pub_file)
-            elif (format == KeyFormat.HEX):
-                KeyWriter.write_hex(priv_key,priv_file)
-                KeyWriter.write_hex(pub_key,pub_file)
+            write(priv_key,priv_file)
+            write(pub_key,pub_file)
+        RSA.Cache.evict(priv_file_name)
+        RSA.Cache.evict(pub_file_name)
         return keys
 
     @staticmethod
@@ -158,89 +289,139 @@ class RSA():
 
         Args:
             key (dict): the key dictionary.
-            format (KeyFormat, optional): the format the key will be saved as. Defaults to KeyFormat.ASCII.
+            format (KeyFormat | str, optional): the format the key will be saved as. Defaults to KeyFormat.ASCII.
             file_name (str, optional): the name of the key file. Defaults to "key.key".
 
         Returns:
             dict: the key dictionary.
         """
+        write = KeyCodecs.writer(format)
         with open(file_name,"w") as file:
-            if(format == KeyFormat.JSON):
-                KeyWriter.write_json(key,file)
-            elif (format == KeyFormat.YML):
-                KeyWriter.write_yml(key,file)
-            elif (format == KeyFormat.RAW):
-                KeyWriter.write_raw(key,file)
-            elif (format == KeyFormat.ASCII):
-                KeyWriter.write_ascii(key,file)
-            elif (format == KeyFormat.HEX):
-                KeyWriter.write_hex(key,file)
+            write(key,file)
+        RSA.Cache.evict(file_name)
         return key
 
     @staticmethod
-    def readKeys(priv_file_name,pub_file_name,format=KeyFormat.ASCII):
+    def readKeys(priv_file_name,pub_file_name,format=KeyFormat.ASCII,cache=True):
         """Read 2 Keys from a file and make them into a usables dictionaries pair.
 
         Args:
             priv_file_name (str): the file where the private key is saved.
             pub_file_name (str): the file where the public key is saved.
-            format (KeyFormat, optional): the format of the files containg the keys. Defaults to KeyFormat.ASCII.
+            format (KeyFormat | str, optional): the format of the files containg the keys. Defaults to KeyFormat.ASCII.
+            cache (bool, optional): use the keys already read if the files didn't change (see readKey). Defaults to True.
 
         Returns:
             (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
         """
-        with open(priv_file_name,"r") as priv_file, open(pub_file_name,"r") as pub_file:
-            if(format == KeyFormat.JSON):
-                priv_key = KeyReader.read_json(priv_file)
-                pub_key = KeyReader.read_json(pub_file)
-            elif (format == KeyFormat.YML):
-                priv_key = KeyReader.read_yml(priv_file)
-                pub_key = KeyReader.read_yml(pub_file)
-            elif (format == KeyFormat.RAW):
-                priv_key = KeyReader.read_raw(priv_file)
-                pub_key = KeyReader.read_raw(pub_file)
-            elif (format == KeyFormat.ASCII):
-                priv_key = KeyReader.read_ascii(priv_file)
-                pub_key = KeyReader.read_ascii(pub_file)
-            elif (format == KeyFormat.HEX):
-                priv_key = KeyReader.read_hex(priv_file)
-                pub_key = KeyReader.read_hex(pub_file)
-            
+        priv_key = RSA.readKey(priv_file_name,format,cache)
+        pub_key = RSA.readKey(pub_file_name,format,cache)
         return priv_key, pub_key
 
     @staticmethod
-    def readKey(file_name, format=KeyFormat.ASCII):
+    def readKey(file_name, format=KeyFormat.ASCII, cache=True):
         """Read a key from a file, and makes it into a usable dictionary.
+        The keys read are saved in RSA.Cache, when the same file is read again and
+        it didn't change the saved key is returned without parsing the file.
+        The dictionaries in the cache are shared, copy them before modifying them.
+        With KeyFormat.AUTO the format is detected from the first characters of the file.
 
         Args:
             file_name (str): the file where the key is saved.
-            format (KeyFormat, optional): the format the key is saved as. Defaults to KeyFormat.ASCII.
+            format (KeyFormat | str, optional): the format the key is saved as. Defaults to KeyFormat.ASCII.
+            cache (bool, optional): use the key already read if the file didn't change. Defaults to True.
+
+        Raises:
+            UnknownFormat: the format is not registered, or with KeyFormat.AUTO it can't be detected.
 
         Returns:
             dict: a dictionary representing the key.
         """
+        format = KeyCodecs.normalize(format)
+        if cache:
+            return RSA.Cache.load(file_name,format,lambda: RSA.__parseKey(file_name,format))
+        return RSA.__parseKey(file_name,format)
+
+    @staticmethod
+    def readDirectory(directory, format=KeyFormat.AUTO, cache=True):
+        """Read all the keys in a directory, by default each one in its own format (see KeyReader.detect_format).
+        The files that are not keys (their format can't be detected) are skipped, sub directories are not read.
+
+        Args:
+            directory (str): the directory where the keys are saved.
+            format (KeyFormat | str, optional): the format the keys are saved as. Defaults to KeyFormat.AUTO.
+            cache (bool, optional): use the keys already read if the files didn't change (see readKey). Defaults to True.
+
+        Returns:
+            dict: the dictionaries representing the keys, by file name.
+        """
+        keys = {}
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if not entry.is_file():
+                    continue
+                try:
+                    keys[entry.path] = RSA.readKey(entry.path,format,cache)
+                except Exception as error:
+                    # the exceptions are instances, so they are compared instead of caught by type
+                    if error is not UnknownFormat:
+                        raise
+        return keys
+
+    @staticmethod
+    def detectKeyFormat(file_name):
+        """Find the format of a key file from its first characters, see KeyReader.detect_format.
+
+        Args:
+            file_name (str): the file where the key is saved.
+
+        Raises:
+            UnknownFormat: the format can't be detected.
+
+        Returns:
+            KeyFormat: the format of the key.
+        """
         with open(file_name,"r") as file:
-            if(format == KeyFormat.JSON):
-                key = KeyReader.read_json(file)
-            elif (format == KeyFormat.YML):
-                key = KeyReader.read_yml(file)
-            elif (format == KeyFormat.RAW):
-                key = KeyReader.read_raw(file)
-            elif (format == KeyFormat.ASCII):
-                key = KeyReader.read_ascii(file)
-            elif (format == KeyFormat.HEX):
-                key = KeyReader.read_hex(file)
-        return key
+            return KeyReader.detect_format(file)
+
+    @staticmethod
+    def evictKeys(file_name=None):
+        """Remove the keys read from a file from the cache.
+
+        Args:
+            file_name (str, optional): the file of the keys to remove, None removes every key. Defaults to None.
+        """
+        RSA.Cache.evict(file_name)
+
+    @staticmethod
+    def __parseKey(file_name, format):
+        """Read a key from a file with the read function the format has in KeyCodecs.
+
+        Args:
+            file_name (str): the file where the key is saved.
+            format (KeyFormat | str): the format the key is saved as.
+
+        Raises:
+            UnknownFormat: the format is not registered in KeyCodecs.
+
+        Returns:
+            dict: a dictionary representing the key.
+        """
+        read = KeyCodecs.reader(format)
+        with open(file_name,"r") as file:
+            return read(file)
 
     @staticmethod
-    def makeKeys(e,d,n,metadata=None):
+    def makeKeys(e,d,n,metadata=None,crt=None):
         """Make a key pair dictionary from the exponents and the metadatas.
+        If the CRT parameters are given they are stored only in the private key.
 
         Args:
             e (Long Integer): the encryption exponent.
             d (Long Integer): the decryption exponent.
             n (Long Integer): the n module of the keys.
             metadata (dict, optional): a dictionary containing the keys metadata. Defaults to None.
+            crt (dict, optional): the CRT parameters of the private key (see makeCRT). Defaults to None.
 
         Returns:
             (dict,dict): 2 dictionaries, the first representig the private key, and the second the public one.
@@ -260,8 +441,48 @@ class RSA():
             "mod n":n,
             "metadata":metadata
         }
+        if crt:
+            priv_key["crt"] = crt
 
         return priv_key,pub_key
+
+    @staticmethod
+    def makeCRT(d,p,q,*others):
+        """Make the CRT parameters dictionary of a private key.
+        With these values the decryption can be done with two half size exponentiations
+        and then recombined with Garner's formula, which is about 3-4 times faster than mᵈ mod n.
+        See https://en.wikipedia.org/wiki/RSA_(cryptosystem)#Using_the_Chinese_remainder_algorithm
+        for more information.
+        For multi-prime keys the other primes r are saved as in PKCS #1 (RFC 8017),
+        each one with d mod (r-1) and the inverse mod r of the product of the primes before it.
+
+        Args:
+            d (Long Integer): the decryption exponent.
+            p (Long Integer): the first prime factor of n.
+            q (Long Integer): the second prime factor of n.
+            others (Long Integer): the other prime factors of n, if any.
+
+        Returns:
+            dict: a dictionary containing p, q, d mod (p-1), d mod (q-1), q⁻¹ mod p and, if any, the other primes.
+        """
+        crt = {
+            "prime p":p,
+            "prime q":q,
+            "exponent dp":d % (p-1),
+            "exponent dq":d % (q-1),
+            "coefficient qinv":modular_inverse(q,p)
+        }
+        if others:
+            product = p*q
+            crt["other primes"] = []
+            for r in others:
+                crt["other primes"].append({
+                    "prime r":r,
+                    "exponent d":d % (r-1),
+                    "coefficient t":modular_inverse(product,r)
+                })
+                product *= r
+        return crt
     
     @staticmethod
     def makeKey(k,n,metadata=None,type="Unknown"):
@@ -289,21 +510,33 @@ class RSA():
         return key
         
     @staticmethod
-    def __divide_bits(bits,random_string):
-        """Divide a bit quantity into 2 values that added make the original quantity.
+    def __divide_bits(bits,random_string,parts=2):
+        """Divide a bit quantity into 2 (or more) values that added make the original quantity.
         This method exist since the p and q prime generating numbers must have some difference in bits length,
         and the n module length is roughly the sum of the 2.
         This method ensure the length of the n value is the desired one.
         If a name is provided it's length it's used.
         If not then a random string is generated with the __get_random_string() method.
+        With more than 2 parts all of them but the last are shortened, and the last one takes the rest
+        (gen_keys then adjusts the last prime with __fit_last_prime, since here n can be shorter).
 
         Args:
             bits (int): a value representing a key length.
             random_string (str): a string used to randomize the process.
+            parts (int, optional): the number of values. Defaults to 2.
 
         Returns:
-            (int,int): a integer pair a,b such that a+b=bits. 
+            (int,...): a integer tuple a,b,... such that a+b+...=bits. 
         """
+        if(parts>2):
+            if(bits>32*parts):
+                part_len = bits//parts - len(random_string)
+            elif (bits<parts):
+                return (1,)*parts
+            else:
+                part_len = bits//parts
+            return (part_len,)*(parts-1) + (bits - part_len*(parts-1),)
+
         if(bits>64):
             p_len = bits/2 - len(random_string)
             q_len = bits - p_len
@@ -316,6 +549,161 @@ class RSA():
 
         return int(p_len), int(q_len)
 
+    @staticmethod
+    def __fit_last_prime(factors, bits, generator=PrimeGenerator.BACKEND):
+        """Replace the last prime of a multi-prime key until n is exactly bits long.
+        The lengths of the primes add up to bits, but each prime has only its highest bit set,
+        so with k primes n can be up to k-1 bits shorter.
+        The last length is chosen from the product P of the other primes: with x = 2^len(P)/P in (1,2],
+        a prime of bits-len(P) bits fits with probability 2-x and one of bits-len(P)+1 bits with probability x-1,
+        the likelier one is used, so on average at most 2 primes are generated.
+
+        Args:
+            factors (list): the primes, the last one is replaced in place.
+            bits (int): the length in bits of n.
+            generator (PrimeGenerator, optional): how the prime is generated. Defaults to PrimeGenerator.BACKEND.
+        """
+        product = 1
+        for prime in factors[:-1]:
+            product *= prime
+        length = bits - product.bit_length()
+        if 2 << product.bit_length() > 3*product:
+            length += 1
+        if length < 2:
+            # too short to be fixed, n is kept as it is
+            return
+        while not 1 << (bits-1) <= product*factors[-1] < 1 << bits:
+            factors[-1] = RSA.__get_prime(length, generator)
+
+    @staticmethod
+    def __choose_exponent(policy, f_di_n):
+        """Choose the encryption exponent e following a policy, and calculate its inverse d.
+
+        Args:
+            policy (ExponentPolicy | int): how e is chosen, an int is used as a fixed exponent.
+            f_di_n (int): λ(n) or φ(n).
+
+        Returns:
+            (int,int,int): GCD(e, f_di_n), e and the inverse of e mod f_di_n, the inverse is None if the GCD is not 1.
+        """
+        if isinstance(policy, ExponentPolicy) and policy == ExponentPolicy.RANDOM:
+            gcd = None
+            tries = 0
+            while gcd != 1:
+                tries += 1
+                encryption_exponent = random.randint(3,f_di_n)
+                gcd = euclidean(encryption_exponent, f_di_n)
+            Metrics.record("gen_keys.exponent_retries", tries-1)
+            # the inverse is the extended euclidean algorithm s coefficient, but in [0, f_di_n)
+            return gcd, encryption_exponent, modular_inverse(encryption_exponent, f_di_n)
+
+        if isinstance(policy, ExponentPolicy):
+            candidates = policy.value if isinstance(policy.value, tuple) else (policy.value,)
+        else:
+            candidates = (policy,)
+        for encryption_exponent in candidates:
+            gcd = euclidean(encryption_exponent, f_di_n)
+            if gcd == 1:
+                return gcd, encryption_exponent, modular_inverse(encryption_exponent, f_di_n)
+        return gcd, encryption_exponent, None
+
+    @staticmethod
+    def __get_prime(bits, generator=PrimeGenerator.BACKEND):
+        """Generate a random prime with the Backend (getPrime or gmpy2.next_prime), or with PrimeSieve.
+        If the metrics are enabled the time taken by the Backend is recorded
+        (the candidates are counted only by PrimeSieve, the Backend generators don't expose them).
+
+        Args:
+            bits (int): the length in bits of the prime.
+            generator (PrimeGenerator, optional): how the prime is generated. Defaults to PrimeGenerator.BACKEND.
+
+        Returns:
+            int: the prime.
+        """
+        if generator == PrimeGenerator.SIEVE:
+            return PrimeSieve.get_prime(bits)
+        if not Metrics.enabled:
+            return Backend.get_prime(bits)
+
+        start = time.perf_counter()
+        prime = Backend.get_prime(bits)
+        Metrics.record("gen_keys.prime_seconds", time.perf_counter()-start)
+        return prime
+
+    @staticmethod
+    def __parallel_primes(lengths, workers, generator=PrimeGenerator.BACKEND):
+        """Search the p and q primes (and the others for multi-prime keys) at the same time with more processes.
+        Exactly workers processes are started, see _divide_workers for how they are divided between the primes.
+        Since the search is random the first prime found for each one is taken
+        and the other processes are stopped.
+
+        Args:
+            lengths (tuple): the length in bits of each prime.
+            workers (int): the number of processes, at least 2.
+            generator (PrimeGenerator, optional): how the primes are generated. Defaults to PrimeGenerator.BACKEND.
+
+        Returns:
+            list: the primes, in the same order of the lengths.
+        """
+        from multiprocessing import Process, Queue
+        start = time.perf_counter()
+        queue = Queue()
+        processes = [
+            Process(target=RSA._search_prime, args=(slots, [lengths[slot] for slot in slots], queue, generator), daemon=True)
+            for slots in RSA._divide_workers(len(lengths), workers)
+        ]
+        for process in processes:
+            process.start()
+
+        primes = {}
+        try:
+            while len(primes) < len(lengths):
+                slot, prime = queue.get()
+                primes.setdefault(slot, prime)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        Metrics.record("gen_keys.parallel_primes_seconds", time.perf_counter()-start)
+        return [primes[slot] for slot in range(len(lengths))]
+
+    @staticmethod
+    def _divide_workers(count, workers):
+        """Divide the processes between the primes.
+        With at least as many processes as primes each prime gets workers // count processes,
+        and the first workers % count primes get one more (with 3 workers p gets 2 and q gets 1).
+        With less processes than primes each process searches more primes, one after the other
+        (with 2 workers and 3 primes the first process searches p and the third prime, the second one q).
+
+        Args:
+            count (int): the number of primes.
+            workers (int): the number of processes.
+
+        Returns:
+            list: the indexes of the primes searched by each process, one tuple for each process.
+        """
+        if workers < count:
+            return [tuple(range(process, count, workers)) for process in range(workers)]
+        share, extra = divmod(workers, count)
+        return [(slot,) for slot in range(count) for _ in range(share + (slot < extra))]
+
+    @staticmethod
+    def _search_prime(slots, lengths, queue, generator=PrimeGenerator.BACKEND):
+        """Search the primes of some slots and put them in the queue, it's run by the __parallel_primes processes.
+
+        Args:
+            slots (tuple): the indexes of the primes, 0 for p, 1 for q and so on.
+            lengths (list): the length in bits of each prime.
+            queue (Queue): the queue the primes are put in.
+            generator (PrimeGenerator, optional): how the primes are generated. Defaults to PrimeGenerator.BACKEND.
+        """
+        for slot, bits in zip(slots, lengths):
+            if generator == PrimeGenerator.SIEVE:
+                queue.put((slot, PrimeSieve.get_prime(bits)))
+            else:
+                queue.put((slot, Backend.get_prime(bits)))
+
     @staticmethod
     def __get_random_string():
         """This method generate a random string with length between 1 and 4 bytes.
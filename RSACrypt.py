@@ -1,5 +1,80 @@
-from math import log2
-from Crypto.Util.number import bytes_to_long, long_to_bytes
+from mmap import mmap as MemoryMap, ACCESS_READ
+from os import PathLike, SEEK_END, fstat
+import io
+import stat
+import struct
+import time
+from collections import deque
+from itertools import islice
+from Backend import Backend
+from KeyIO import key_fingerprint, CRTFields, OtherPrimeFields
+from Metrics import Metrics
+
+class PreparedKey():
+    """
+    A key dictionary compiled for the RSACrypt methods.
+    The values the methods need for every block (exponent, module, block sizes, CRT parameters)
+    are calculated once and kept as attributes, instead of being looked up in the dictionary every time.
+    Build it once and reuse it, every RSACrypt method accepts it in place of the dictionary.
+
+    Attributes:
+        key (dict): the dictionary the key was built from.
+        exponent (Long Integer): the key exponent.
+        modulus (Long Integer): the key n module.
+        width (int): the byte length of n, the width of an encrypted block.
+        container_chunk (int): the biggest number of bytes always smaller than n, the plaintext block size.
+        decrypts (bool): whether crypt_bytes, crypt_string and crypt_file decrypt with this key,
+                         None when the key type is neither "public key" nor "private key" and no direction was given.
+        chunk (int): the size of the input blocks of crypt_bytes, crypt_string and crypt_file,
+                     container_chunk when encrypting, width when decrypting and None when decrypts is None.
+        block_width (int): the size of the output blocks, width when encrypting, container_chunk when decrypting
+                           (the leading zeros of the last decrypted block are removed, its length is not known)
+                           and None when decrypts is None.
+        crt (tuple): the CRT parameters (p, q, dp, dq, qinv) or None.
+        other_primes (tuple): for multi-prime keys, a (r, d, t, product of the primes before r) tuple for each other prime.
+        fingerprint (bytes): the key fingerprint.
+    """
+    __slots__ = ("key","exponent","modulus","width","chunk","container_chunk","decrypts","block_width","crt","other_primes","fingerprint")
+
+    def __init__(self,key,decrypt=None):
+        """
+        Args:
+            key (dict): a dictionary that descrybe the key.
+            decrypt (bool, optional): whether the key decrypts, by default a private key decrypts, a public key encrypts
+                                      and the direction of any other key is unknown.
+        """
+        self.key = key
+        self.exponent = key['key exponent']
+        self.modulus = key['mod n']
+        bits = self.modulus.bit_length()
+        self.width = (bits+7) // 8
+        self.container_chunk = (bits-1) // 8
+
+        # the blocks depend only on n: the metadata length can be missing or wrong,
+        # and a block as long as n can be bigger than n
+        if decrypt is None and key.get("type") in ("public key","private key"):
+            decrypt = key["type"] == "private key"
+        self.decrypts = decrypt
+        if decrypt is None:
+            # only the methods that don't depend on the direction (containers, crypt_int) can use the key
+            self.chunk, self.block_width = None, None
+        elif decrypt:
+            self.chunk, self.block_width = self.width, self.container_chunk
+        else:
+            self.chunk, self.block_width = self.container_chunk, self.width
+
+        self.crt = None
+        self.other_primes = ()
+        if 'crt' in key:
+            self.crt = tuple(key['crt'][field] for field in CRTFields)
+            product = self.crt[0]*self.crt[1]
+            others = []
+            for other in key['crt'].get('other primes',[]):
+                r, d, t = (other[field] for field in OtherPrimeFields)
+                others.append((r,d,t,product))
+                product *= r
+            self.other_primes = tuple(others)
+        self.fingerprint = key_fingerprint(key)
 
 class RSACrypt():
     """
@@ -16,107 +91,845 @@ class RSACrypt():
     The Crypt in the name stands for both Encrypt and Decrypt
     since you can Encrypt using the public key as the "key" param
     and you can Decrypt using the private key as the "key" param.
+    The blocks are chosen by the key type (see block_geometry), to encrypt with a private key
+    prepare it with RSACrypt.prepare_key(key,decrypt=False).
+    Keys whose type is unknown (like the RAW and HEX ones) must be prepared with the direction.
+
+    Raises:
+        RSACrypt.InvalidContainer: the data is not a container or its version is not supported.
+        RSACrypt.WrongKey: the key fingerprint doesn't match the container one.
+        RSACrypt.UnknownLength: the plaintext length can't be known before writing the container.
+        RSACrypt.BufferTooSmall: the output buffer of crypt_into is too small.
+        RSACrypt.UnknownDirection: the key type is unknown, so it's not known if it encrypts or decrypts.
     """
+    InvalidContainer = Exception("Invalid RSA container")
+    WrongKey = Exception("The key doesn't match the container")
+    UnknownLength = Exception("The plaintext length is unknown and the destination is not seekable")
+    BufferTooSmall = Exception("The output buffer is too small")
+    UnknownDirection = Exception("The key type is unknown, prepare it with RSACrypt.prepare_key(key,decrypt=True) or (key,decrypt=False)")
+
+    # magic, version, key fingerprint, block size, block width, plaintext length
+    ContainerMagic = b"RSAC"
+    ContainerVersion = 1
+    ContainerHeader = struct.Struct(">4sB32sIIQ")
+
+    # number of blocks sent to a worker process in a single task
+    WorkerBatch = 64
 
     @staticmethod
-    def crypt_bytes(key,bytearray):
+    def crypt_bytes(key,bytearray,workers=None):
         """Perform decryption on a byte array.
         It's unusual to have a decrypted message in the form of a byte array using this modules
         but if you have one you could encrypt it with this method.
+        The message is divided with memoryview slices (it's never copied),
+        and the blocks are written in a buffer allocated once (use crypt_into to avoid copying it to the result).
 
         Args:
-            key (dict): a dictionary that descrybe the key.
-            bytearray (bytes): a message to encrypt/decrypt.
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            bytearray (bytes): a message to encrypt/decrypt, any bytes-like object.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
 
         Returns:
             bytes: the encrypted/decrypted message as a byte array.
         """
-        chunk = abs(int(log2(key['mod n'])))
-        if(key['metadata'] != "Unknown"):
-            if(key['metadata']['length']):
-                chunk = key['metadata']['length']
-        chunk //= 8
-        msg = bytearray[0:chunk]
-        cmsg = b''
-        while msg:
-            cmsg += RSACrypt.__crypt(key,msg)
-            bytearray = bytearray[chunk:]
-            msg = bytearray[0:chunk]
-        return cmsg
+        key = RSACrypt.__block_key(key)
+        if not workers and not Metrics.enabled and len(bytearray) <= key.chunk:
+            # a single block, no need to divide the message
+            if not bytearray:
+                return b''
+            return RSACrypt.__pack_block(key,RSACrypt.__lowlevel_crypt(key,Backend.from_bytes(bytearray)),True)
+        return RSACrypt.__crypt_to_bytes(key,bytearray,len(bytearray),workers)
 
     @staticmethod
-    def crypt_string(key,str):
+    def crypt_string(key,str,workers=None):
         """
         Perform encryption on a string.
         It's unusual to have an encrypted message in the form of a string using this modules
         but if you have one you could decrypt it with this method.
 
         Args:
-            key (dict): a dictionary that descrybe the key.
+            key (dict | PreparedKey): a dictionary that descrybe the key.
             str (str): a message to encrypt/decrypt.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
 
         Returns:
             bytes: the encrypted/decrypted message as a byte array.
         """
-        chunk = abs(int(log2(key['mod n'])))
-        if(key['metadata'] != "Unknown"):
-            if(key['metadata']['length']):
-                chunk = key['metadata']['length']
-        chunk //= 8
-        str = str.encode()
-        msg = str[0:chunk]
-        cmsg = b''
-        while msg:
-            cmsg += RSACrypt.__crypt(key,msg)
-            str = str[chunk:]
-            msg = str[0:chunk]
-        return cmsg
+        return RSACrypt.crypt_bytes(key,str.encode(),workers)
 
     @staticmethod
-    def crypt_file(key,filename):
+    def crypt_file(key,filename,workers=None,mmap=False):
         """
         Perform the reading from a file and encrypt/decrypt it's content.
+        The whole result is kept in memory, use crypt_stream for big files (or crypt_into to avoid copying the result).
 
         Args:
-            key (dict): a dictionary that descrybe the key.
+            key (dict | PreparedKey): a dictionary that descrybe the key.
             filename (str): the name of the file to open.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+            mmap (bool, optional): memory map the file and slice it, instead of reading it a block at a time. Defaults to False.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
 
         Returns:
             bytes: the encrypted/decrypted message as a byte array.
         """
-        with open(filename,"rb") as file:
-            chunk = abs(int(log2(key['mod n'])))
-            if(key['metadata'] != "Unknown"):
-                if(key['metadata']['length']):
-                    chunk = key['metadata']['length']
+        key = RSACrypt.__block_key(key)
+        return RSACrypt.__crypt_to_bytes(key,filename,RSACrypt.__source_length(filename),workers,mmap)
 
-            chunk //= 8
-            msg = file.read(chunk)
-            cmsg = b''
-            while msg:
-                cmsg += RSACrypt.__crypt(key,msg)
-                msg = file.read(chunk)
-            return cmsg
+    @staticmethod
+    def crypt_into(key,source,buffer,workers=None,mmap=False):
+        """
+        Perform the encryption/decryption of a source and write the result in a preallocated buffer,
+        from its start. output_size gives a buffer size that is always big enough.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file | bytes | iterable): a file name, a binary file opened for reading, a bytes-like object or an iterable of bytes chunks.
+            buffer (bytearray | memoryview | mmap): a writable bytes-like object.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+            mmap (bool, optional): memory map the source if it's a file, see crypt_file. Defaults to False.
+
+        Raises:
+            RSACrypt.BufferTooSmall: the result doesn't fit in the buffer.
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
+
+        Returns:
+            int: the number of bytes written in the buffer.
+        """
+        key = RSACrypt.__block_key(key)
+        written = 0
+        with memoryview(buffer).cast("B") as output:
+            for block in RSACrypt.iter_crypt(key,source,workers,mmap):
+                end = written + len(block)
+                if end > len(output):
+                    raise RSACrypt.BufferTooSmall
+                output[written:end] = block
+                written = end
+        return written
 
     @staticmethod
-    def __crypt(key,enc):
+    def output_size(key,length):
         """
-        Perform the encryption using the exponent part of a key and the module.
-        like this:
-        mᴷ mod n, where n is the key module, m is the message and k is the exponent part of a key.
-        But the message and the crypted message are handled as bytes.
+        The biggest size the result of crypt_bytes, crypt_file or crypt_into can have for a source length.
+        Every block of the result is at most as long as n.
 
         Args:
-            key (dict): a dictionary that descrybe the key.
-            enc (bytes): a byte array that represent the message to be encrypted/decrypted.
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            length (int): the length of the source in bytes.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
 
         Returns:
-            bytes: the encrypted/decrypted message as a byte array.
+            int: the size in bytes.
+        """
+        key = RSACrypt.__block_key(key)
+        return -(-length // key.chunk) * key.width
+
+    @staticmethod
+    def crypt_stream(key,source,destination,workers=None,mmap=False):
+        """
+        Perform the encryption/decryption of a source and write the result to a destination.
+        Every block is written as soon as it's produced, so the memory used
+        doesn't depend on the size of the source.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file | iterable): a file name, a binary file opened for reading or an iterable of bytes chunks.
+            destination (str | file): a file name or a binary file opened for writing.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+            mmap (bool, optional): memory map the source if it's a file, see crypt_file. Defaults to False.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
+
+        Returns:
+            int: the number of bytes written to the destination.
+        """
+        # checked before the destination is opened
+        key = RSACrypt.__block_key(key)
+        if hasattr(destination,'write'):
+            return RSACrypt.__write_blocks(RSACrypt.iter_crypt(key,source,workers,mmap),destination)
+        with open(destination,"wb") as file:
+            return RSACrypt.__write_blocks(RSACrypt.iter_crypt(key,source,workers,mmap),file)
+
+    @staticmethod
+    def iter_crypt(key,source,workers=None,mmap=False):
+        """
+        Perform the encryption/decryption of a source one block at a time.
+        This is a generator, each encrypted/decrypted block is yielded as soon as it's produced.
+        If workers is greater than 1 the blocks are divided between that many processes,
+        but they are still yielded in order.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file | bytes | iterable): a file name, a binary file opened for reading, a bytes-like object or an iterable of bytes chunks.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+            mmap (bool, optional): memory map the source if it's a file, see crypt_file. Defaults to False.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
+
+        Yields:
+            bytes: an encrypted/decrypted block.
+        """
+        key = RSACrypt.__block_key(key)
+        blocks = RSACrypt.__read_blocks(source,key.chunk,mmap)
+        if not Metrics.enabled:
+            values = (Backend.from_bytes(msg) for msg in blocks)
+            yield from RSACrypt.__pack_blocks(key,RSACrypt.__lowlevel_map(key,values,workers))
+            return
+
+        sizes = [0,0]
+        def read_values():
+            for msg in blocks:
+                sizes[0] += len(msg)
+                yield Backend.from_bytes(msg)
+        for block in RSACrypt.__pack_blocks(key,RSACrypt.__lowlevel_map(key,read_values(),workers)):
+            sizes[1] += len(block)
+            yield block
+        RSACrypt.__record_bytes(*sizes)
+
+    @staticmethod
+    def __pack_blocks(key,values):
+        """
+        Turn the encrypted/decrypted values into blocks of the key block width (see block_geometry).
+        The last value is held until the next one comes, since the last decrypted block is packed differently.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            values (iterable): the encrypted/decrypted integers.
+
+        Yields:
+            bytes: an encrypted/decrypted block.
+        """
+        previous = None
+        for value in values:
+            if previous is not None:
+                yield RSACrypt.__pack_block(key,previous,False)
+            previous = value
+        if previous is not None:
+            yield RSACrypt.__pack_block(key,previous,True)
+
+    @staticmethod
+    def __pack_block(key,value,last):
+        """
+        Turn an encrypted/decrypted value into a block of the key block width,
+        but the leading zeros of the last decrypted block are removed.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            value (Long Integer): the encrypted/decrypted integer.
+            last (bool): whether it's the last block of the message.
+
+        Returns:
+            bytes: the block.
+        """
+        if key.decrypts and (last or value >> 8*key.block_width):
+            # a value too big for a plaintext block wasn't encrypted with the other key of the pair,
+            # it's kept as long as n at most so output_size is still enough
+            return Backend.to_bytes(value)
+        return Backend.to_bytes(value,key.block_width)
+
+    @staticmethod
+    def crypt_to_container(key,source,destination,length=None,workers=None):
+        """
+        Perform the encryption/decryption of a source and write it as a container.
+        A container starts with a header (version, key fingerprint, block size, block width and plaintext length)
+        followed by blocks that all have the same width (the byte length of n),
+        so every block can be found by its offset without reading the others.
+        The plaintext blocks are always smaller than n.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file | iterable): a file name, a binary file opened for reading or an iterable of bytes chunks.
+            destination (str | file): a file name or a binary file opened for writing.
+            length (int, optional): the length of the source, needed only if it can't be known otherwise
+                                    and the destination is not seekable. Defaults to None.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+
+        Raises:
+            RSACrypt.UnknownLength: the plaintext length can't be known before writing the container.
+
+        Returns:
+            int: the number of bytes written to the destination.
+        """
+        if not hasattr(destination,'write'):
+            with open(destination,"wb") as file:
+                return RSACrypt.crypt_to_container(key,source,file,length,workers)
+
+        if length is None:
+            length = RSACrypt.__source_length(source)
+        patch = length is None
+        if patch and not (hasattr(destination,'seekable') and destination.seekable()):
+            raise RSACrypt.UnknownLength
+
+        key = RSACrypt.prepare_key(key)
+        chunk, width = key.container_chunk, key.width
+        start = destination.tell() if patch else 0
+        header = RSACrypt.__pack_header(key,chunk,width,length or 0)
+        destination.write(header)
+        written = len(header)
+
+        plain_length = [0]
+        def read_values():
+            for msg in RSACrypt.__read_blocks(source,chunk):
+                plain_length[0] += len(msg)
+                yield Backend.from_bytes(msg)
+
+        for value in RSACrypt.__lowlevel_map(key,read_values(),workers):
+            destination.write(Backend.to_bytes(value,width))
+            written += width
+        plain_length = plain_length[0]
+
+        if patch:
+            end = destination.tell()
+            destination.seek(start)
+            destination.write(RSACrypt.__pack_header(key,chunk,width,plain_length))
+            destination.seek(end)
+        elif plain_length != length:
+            raise RSACrypt.UnknownLength
+        RSACrypt.__record_bytes(plain_length,written)
+        return written
+
+    @staticmethod
+    def crypt_from_container(key,source,destination,first_block=0,last_block=None,workers=None):
         """
-        return long_to_bytes(
-            RSACrypt.__lowlevel_crypt(key,bytes_to_long(enc))
+        Perform the encryption/decryption of a container and write the plaintext to a destination.
+        Since the blocks have a fixed width a range of blocks can be processed alone,
+        this can be used to resume a partial work or to split the work.
+        Block i of the container is always the plaintext from byte i*block_size.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            source (str | file): a file name or a seekable binary file opened for reading.
+            destination (str | file): a file name or a binary file opened for writing.
+            first_block (int, optional): the first block to process. Defaults to 0.
+            last_block (int, optional): the block after the last one to process, None means until the end. Defaults to None.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+
+        Raises:
+            RSACrypt.InvalidContainer: the source is not a valid container.
+            RSACrypt.WrongKey: the key fingerprint doesn't match the container one.
+
+        Returns:
+            int: the number of bytes written to the destination.
+        """
+        if not hasattr(source,'read'):
+            with open(source,"rb") as file:
+                return RSACrypt.crypt_from_container(key,file,destination,first_block,last_block,workers)
+        if not hasattr(destination,'write'):
+            with open(destination,"wb") as file:
+                return RSACrypt.crypt_from_container(key,source,file,first_block,last_block,workers)
+
+        key = RSACrypt.prepare_key(key)
+        header = RSACrypt.__check_header(key,source)
+        start = source.tell()
+        blocks = RSACrypt.container_blocks(header)
+        if last_block is None or last_block > blocks:
+            last_block = blocks
+
+        width = header['block width']
+        source.seek(start + first_block*width)
+        def read_values():
+            for _ in range(first_block,last_block):
+                data = source.read(width)
+                if len(data) != width:
+                    raise RSACrypt.InvalidContainer
+                yield Backend.from_bytes(data)
+
+        written = 0
+        values = RSACrypt.__lowlevel_map(key,read_values(),workers)
+        for index, value in enumerate(values,first_block):
+            block = RSACrypt.__unpack_value(header,index,value)
+            destination.write(block)
+            written += len(block)
+        RSACrypt.__record_bytes((last_block-first_block)*width,written)
+        return written
+
+    @staticmethod
+    def crypt_container_block(key,file,index):
+        """
+        Perform the encryption/decryption of a single block of a container.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            file (file): a seekable binary file opened for reading, positioned at the start of the container.
+            index (int): the index of the block.
+
+        Raises:
+            RSACrypt.InvalidContainer: the file is not a valid container or the block doesn't exist.
+            RSACrypt.WrongKey: the key fingerprint doesn't match the container one.
+
+        Returns:
+            bytes: the plaintext of the block.
+        """
+        key = RSACrypt.prepare_key(key)
+        start = file.tell()
+        header = RSACrypt.__check_header(key,file)
+        if not 0 <= index < RSACrypt.container_blocks(header):
+            raise RSACrypt.InvalidContainer
+        file.seek(start + RSACrypt.ContainerHeader.size + index*header['block width'])
+        data = file.read(header['block width'])
+        if len(data) != header['block width']:
+            raise RSACrypt.InvalidContainer
+        return RSACrypt.__unpack_value(header,index,RSACrypt.__lowlevel_crypt(key,Backend.from_bytes(data)))
+
+    @staticmethod
+    def crypt_int(key,value):
+        """
+        Perform the encryption/decryption of a single integer smaller than n,
+        with the CRT parameters if the key has them.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            value (Long Integer): the integer to encrypt/decrypt.
+
+        Returns:
+            Long Integer: the encrypted/decrypted integer.
+        """
+        return RSACrypt.__lowlevel_crypt(RSACrypt.prepare_key(key),value)
+
+    @staticmethod
+    def read_container_header(file):
+        """
+        Read the header of a container.
+
+        Args:
+            file (file): a binary file opened for reading, positioned at the start of the container.
+
+        Raises:
+            RSACrypt.InvalidContainer: the file is not a container or its version is not supported.
+
+        Returns:
+            dict: a dictionary with the version, fingerprint, block size, block width and length of the container.
+        """
+        data = file.read(RSACrypt.ContainerHeader.size)
+        if len(data) != RSACrypt.ContainerHeader.size:
+            raise RSACrypt.InvalidContainer
+        magic, version, fingerprint, chunk, width, length = RSACrypt.ContainerHeader.unpack(data)
+        if magic != RSACrypt.ContainerMagic or version != RSACrypt.ContainerVersion or chunk == 0 or width <= chunk:
+            raise RSACrypt.InvalidContainer
+        return {
+            "version":version,
+            "fingerprint":fingerprint,
+            "block size":chunk,
+            "block width":width,
+            "length":length
+        }
+
+    @staticmethod
+    def container_geometry(key):
+        """
+        Calculate the block size and the block width of a container.
+        The block size is the biggest number of bytes always smaller than n,
+        the block width is the byte length of n.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+
+        Returns:
+            (int,int): the block size and the block width in bytes.
+        """
+        key = RSACrypt.prepare_key(key)
+        return key.container_chunk, key.width
+
+    @staticmethod
+    def block_geometry(key):
+        """
+        Calculate the blocks of crypt_bytes, crypt_string and crypt_file, they depend only on n.
+        When encrypting the input is divided in blocks of the biggest number of bytes always smaller than n,
+        and every encrypted block is as long as n, so it can be divided back when decrypting.
+        When decrypting the input is divided in blocks as long as n, and the output blocks are as long as the encryption input blocks,
+        but the leading zeros of the last one are removed, since its length is not known.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
+
+        Returns:
+            (int,int): the input block size and the output block width in bytes
+                       (when decrypting the last output block can be shorter, its leading zeros are removed).
+        """
+        key = RSACrypt.__block_key(key)
+        return key.chunk, key.block_width
+
+    @staticmethod
+    def container_blocks(header):
+        """
+        Calculate the number of blocks of a container.
+
+        Args:
+            header (dict): the container header (see read_container_header).
+
+        Returns:
+            int: the number of blocks.
+        """
+        return -(-header['length'] // header['block size'])
+
+    @staticmethod
+    def prepare_key(key,decrypt=None):
+        """
+        Compile a key dictionary into a PreparedKey.
+        If the key is already a PreparedKey it's returned as it is, unless decrypt changes it.
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+            decrypt (bool, optional): whether the key decrypts, see PreparedKey. Defaults to None.
+
+        Returns:
+            PreparedKey: the compiled key.
+        """
+        if isinstance(key,PreparedKey):
+            if decrypt is None or decrypt == key.decrypts:
+                return key
+            key = key.key
+        return PreparedKey(key,decrypt)
+
+    @staticmethod
+    def __block_key(key):
+        """
+        Compile a key for the methods whose blocks depend on the direction (see block_geometry).
+
+        Args:
+            key (dict | PreparedKey): a dictionary that descrybe the key.
+
+        Raises:
+            RSACrypt.UnknownDirection: the key type is unknown and the key wasn't prepared with the direction.
+
+        Returns:
+            PreparedKey: the compiled key.
+        """
+        key = RSACrypt.prepare_key(key)
+        if key.decrypts is None:
+            raise RSACrypt.UnknownDirection
+        return key
+
+    @staticmethod
+    def __pack_header(key,chunk,width,length):
+        """
+        Make the header of a container.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            chunk (int): the block size in bytes.
+            width (int): the block width in bytes.
+            length (int): the plaintext length in bytes.
+
+        Returns:
+            bytes: the header.
+        """
+        return RSACrypt.ContainerHeader.pack(
+            RSACrypt.ContainerMagic,
+            RSACrypt.ContainerVersion,
+            key.fingerprint,
+            chunk,
+            width,
+            length
         )
 
+    @staticmethod
+    def __check_header(key,file):
+        """
+        Read the header of a container and check it was made with the key pair.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            file (file): a binary file opened for reading, positioned at the start of the container.
+
+        Raises:
+            RSACrypt.InvalidContainer: the file is not a valid container.
+            RSACrypt.WrongKey: the key fingerprint doesn't match the container one.
+
+        Returns:
+            dict: the container header.
+        """
+        header = RSACrypt.read_container_header(file)
+        if header['fingerprint'] != key.fingerprint:
+            raise RSACrypt.WrongKey
+        return header
+
+    @staticmethod
+    def __unpack_value(header,index,value):
+        """
+        Turn an encrypted/decrypted container block into bytes,
+        the last block is cut to the plaintext length.
+
+        Args:
+            header (dict): the container header.
+            index (int): the index of the block.
+            value (Long Integer): the encrypted/decrypted block.
+
+        Raises:
+            RSACrypt.InvalidContainer: the value doesn't fit in a block.
+
+        Returns:
+            bytes: the plaintext of the block.
+        """
+        chunk = header['block size']
+        size = min(chunk, header['length'] - index*chunk)
+        block = Backend.to_bytes(value,chunk)
+        if len(block) != chunk:
+            # the value is bigger than a block, the container or the key is wrong
+            raise RSACrypt.InvalidContainer
+        return block[chunk-size:]
+
+    @staticmethod
+    def __source_length(source):
+        """
+        Calculate the length of a source without reading it, if possible.
+
+        Args:
+            source (str | file | iterable): a file name, a binary file opened for reading or an iterable of bytes chunks.
+
+        Returns:
+            int: the length in bytes, or None if it can't be known.
+        """
+        if isinstance(source,(str,PathLike)):
+            with open(source,"rb") as file:
+                return file.seek(0,SEEK_END)
+        if isinstance(source,(bytes,bytearray,memoryview)):
+            return len(source)
+        if hasattr(source,'seekable') and source.seekable():
+            position = source.tell()
+            end = source.seek(0,SEEK_END)
+            source.seek(position)
+            return end - position
+        return None
+
+    @staticmethod
+    def __crypt_to_bytes(key,source,length,workers=None,mmap=False):
+        """
+        Perform crypt_into on a buffer of output_size bytes, allocated once.
+        The result is copied once from the buffer, crypt_into avoids that copy.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            source (str | file | bytes | iterable): the source, see crypt_into.
+            length (int): the length of the source in bytes.
+            workers (int, optional): the number of processes the blocks are divided between. Defaults to None.
+            mmap (bool, optional): memory map the source if it's a file. Defaults to False.
+
+        Returns:
+            bytes: the encrypted/decrypted message as a byte array.
+        """
+        buffer = bytearray(RSACrypt.output_size(key,length))
+        written = RSACrypt.crypt_into(key,source,buffer,workers,mmap)
+        # the blocks can be shorter than n, the unused end isn't copied
+        with memoryview(buffer) as view:
+            return bytes(view[:written])
+
+    @staticmethod
+    def __read_blocks(source,chunk,mmap=False):
+        """
+        Divide a source into blocks of the given size, the last one can be shorter.
+        Bytes-like sources (and memory mapped files) are divided in memoryview slices, without copying them.
+        Only one block (plus one chunk of the source) is kept in memory.
+
+        Args:
+            source (str | file | bytes | iterable): a file name, a binary file opened for reading, a bytes-like object or an iterable of bytes chunks.
+            chunk (int): the block size in bytes.
+            mmap (bool, optional): memory map the source if it's a regular file. Defaults to False.
+
+        Yields:
+            bytes | memoryview: a block of the source.
+        """
+        if isinstance(source,(str,PathLike)):
+            with open(source,"rb") as file:
+                yield from RSACrypt.__read_blocks(file,chunk,mmap)
+            return
+        if hasattr(source,'read'):
+            if mmap and RSACrypt.__mappable(source):
+                yield from RSACrypt.__map_blocks(source,chunk)
+                return
+            msg = source.read(chunk)
+            while msg:
+                yield msg
+                msg = source.read(chunk)
+            return
+        if isinstance(source,(bytes,bytearray,memoryview)):
+            source = [source]
+        # the end of a chunk that doesn't fill a block, it's joined with the start of the next one
+        pending = bytearray()
+        for data in source:
+            with memoryview(data).cast("B") as view:
+                start = 0
+                if pending:
+                    start = chunk - len(pending)
+                    pending += view[:start]
+                    if len(pending) < chunk:
+                        continue
+                    yield bytes(pending)
+                    pending.clear()
+                end = start + (len(view) - start) // chunk * chunk
+                for position in range(start,end,chunk):
+                    yield view[position:position+chunk]
+                pending += view[end:]
+        if pending:
+            yield bytes(pending)
+
+    @staticmethod
+    def __mappable(file):
+        """
+        Check if a file can be memory mapped: it must be a regular file, positioned at its start.
+
+        Args:
+            file (file): a binary file opened for reading.
+
+        Returns:
+            bool: True if the file can be memory mapped.
+        """
+        try:
+            return stat.S_ISREG(fstat(file.fileno()).st_mode) and file.tell() == 0
+        except (AttributeError,OSError,io.UnsupportedOperation):
+            return False
+
+    @staticmethod
+    def __map_blocks(file,chunk):
+        """
+        Memory map a file and divide it in memoryview slices.
+        The file position is moved to the end, as if it was read.
+
+        Args:
+            file (file): a regular binary file opened for reading.
+            chunk (int): the block size in bytes.
+
+        Yields:
+            memoryview: a block of the file.
+        """
+        size = fstat(file.fileno()).st_size
+        if size:
+            mapped = MemoryMap(file.fileno(),size,access=ACCESS_READ)
+            view = memoryview(mapped)
+            try:
+                for position in range(0,size,chunk):
+                    yield view[position:position+chunk]
+            finally:
+                view.release()
+                try:
+                    mapped.close()
+                except BufferError:
+                    # a block is still used by the caller, the map is closed when it's released
+                    pass
+        file.seek(size)
+
+    @staticmethod
+    def __write_blocks(blocks,file):
+        """
+        Write the blocks to a file as they are produced.
+
+        Args:
+            blocks (iterable): the encrypted/decrypted blocks.
+            file (file): a binary file opened for writing.
+
+        Returns:
+            int: the number of bytes written.
+        """
+        written = 0
+        for block in blocks:
+            file.write(block)
+            written += len(block)
+        return written
+
+    @staticmethod
+    def __lowlevel_map(key,values,workers=None):
+        """
+        Perform __lowlevel_crypt on every value, in order.
+        If workers is greater than 1 the values are sent in batches of WorkerBatch
+        to a pool of processes, the key is sent to each process only once.
+        At most 2 batches per process are in flight, so the memory used stays bounded.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            values (iterable): the integers to be encrypted/decrypted.
+            workers (int, optional): the number of processes. Defaults to None.
+
+        Yields:
+            Long Integer: an encrypted/decrypted value.
+        """
+        if (not workers or workers <= 1) and not Metrics.enabled:
+            for value in values:
+                yield RSACrypt.__lowlevel_crypt(key,value)
+            return
+
+        blocks = 0
+        if not workers or workers <= 1:
+            # the same as above, but it measures the time of each exponentiation
+            seconds = 0.0
+            for value in values:
+                start = time.perf_counter()
+                result = RSACrypt.__lowlevel_crypt(key,value)
+                seconds += time.perf_counter() - start
+                blocks += 1
+                yield result
+            Metrics.record("rsacrypt.blocks",blocks)
+            Metrics.record("rsacrypt.modexp_seconds",seconds)
+            return
+
+        # imported here, so the serial path doesn't pay for it
+        from concurrent.futures import ProcessPoolExecutor
+        values = iter(values)
+        with ProcessPoolExecutor(workers,initializer=RSACrypt._init_worker,initargs=(key,Backend.name)) as executor:
+            pending = deque()
+            batch = list(islice(values,RSACrypt.WorkerBatch))
+            while batch:
+                blocks += len(batch)
+                pending.append(executor.submit(RSACrypt._crypt_batch,batch))
+                if len(pending) >= 2*workers:
+                    yield from pending.popleft().result()
+                batch = list(islice(values,RSACrypt.WorkerBatch))
+            while pending:
+                yield from pending.popleft().result()
+        Metrics.record("rsacrypt.blocks",blocks)
+
+    @staticmethod
+    def __record_bytes(bytes_in,bytes_out):
+        """
+        Record the bytes read and written by a call, if the metrics are enabled.
+
+        Args:
+            bytes_in (int): the bytes read.
+            bytes_out (int): the bytes written.
+        """
+        Metrics.record("rsacrypt.bytes_in",bytes_in)
+        Metrics.record("rsacrypt.bytes_out",bytes_out)
+
+    @staticmethod
+    def _init_worker(key,backend):
+        """
+        Save the key in a worker process and use the same big integer backend of the parent,
+        it's the initializer of the process pool.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            backend (str): the name of the Backend.
+        """
+        RSACrypt._worker_key = key
+        Backend.use(backend)
+
+    @staticmethod
+    def _crypt_batch(values):
+        """
+        Perform __lowlevel_crypt on a batch of values with the key of the worker process.
+
+        Args:
+            values (list): the integers to be encrypted/decrypted.
+
+        Returns:
+            list: the encrypted/decrypted values.
+        """
+        return [RSACrypt.__lowlevel_crypt(RSACrypt._worker_key,value) for value in values]
+
     @staticmethod
     def __lowlevel_crypt(key,enc_int):
         """
@@ -125,14 +938,45 @@ class RSACrypt():
         mᴷ mod n, where n is the key module, m is the message and k is the exponent part of a key.
 
         Args:
-            key (dict): a dictionary that descrybe the key.
+            key (PreparedKey): the compiled key.
             enc_int (Long Integer): an integer that represent the message to be encrypted/decrypted.
 
         Returns:
             Long Integer: the encrypted/decrypted message as a int.
         """
-        return pow(
+        if key.crt:
+            return RSACrypt.__crt_crypt(key.crt,key.other_primes,enc_int)
+        return Backend.powmod(
             enc_int,
-            key['key exponent'],
-            key['mod n']
-        )
\ No newline at end of file
+            key.exponent,
+            key.modulus
+        )
+
+    @staticmethod
+    def __crt_crypt(crt,other_primes,enc_int):
+        """
+        Perform the decryption using the CRT parameters of a private key.
+        Two half size exponentiations are done, one mod p and one mod q,
+        and the results are recombined with Garner's formula:
+        m = m₂ + q·(qInv·(m₁ - m₂) mod p).
+        For multi-prime keys the result is then extended with each other prime r,
+        m = m + R·(t·(mᵣ - m) mod r) where R is the product of the primes before r (see RFC 8017 RSADP).
+
+        Args:
+            crt (tuple): the CRT parameters of the private key (p, q, dp, dq, qinv).
+            other_primes (tuple): the (r, d, t, R) parameters of the other primes.
+            enc_int (Long Integer): an integer that represent the message to be decrypted.
+
+        Returns:
+            Long Integer: the decrypted message as a int.
+        """
+        p, q, dp, dq, qinv = crt
+        m1 = Backend.powmod(enc_int, dp, p)
+        m2 = Backend.powmod(enc_int, dq, q)
+        h = (qinv * (m1 - m2)) % p
+        m = m2 + h * q
+        for r, d, t, product in other_primes:
+            mr = Backend.powmod(enc_int, d, r)
+            h = (t * (mr - m)) % r
+            m += product * h
+        return m
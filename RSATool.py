@@ -0,0 +1,282 @@
+"""The command line tool of the RSA modules.
+
+Generate a key pair:
+> python -m RSATool keygen --bits 2048 --algorithm LAMBDA --format JSON --priv priv.key --pub pub.key
+Encrypt and decrypt in a pipeline, from stdin to stdout:
+> tar c docs/ | python -m RSATool encrypt -k pub.key | python -m RSATool decrypt -k priv.key | tar x
+Encrypt many files with 4 processes, each one to file.rsa, and print the throughput:
+> python -m RSATool encrypt -k pub.key *.txt -j 4 --stats
+Convert a key to another format:
+> python -m RSATool convert priv.key priv.json --to JSON
+"""
+import argparse
+import os
+import sys
+import time
+
+from Backend import Backend
+from HybridCrypt import HybridCrypt
+from KeyIO import KeyFormat
+from RSA import RSA, KeyAlgorithm, ExponentPolicy, PrimeGenerator
+from RSACrypt import RSACrypt
+
+class _CountingReader():
+    """
+    A binary file that counts the bytes read from it, for the stats of stdin.
+    """
+    def __init__(self,file):
+        self.file = file
+        self.count = 0
+
+    def read(self,size=-1):
+        data = self.file.read(size)
+        self.count += len(data)
+        return data
+
+    def seekable(self):
+        return False
+
+class RSATool():
+    """
+    This class runs the commands of the tool: the key is read once, and each input is encrypted or decrypted
+    as a stream, so the memory used doesn't depend on its size. With more inputs and more workers
+    the inputs are divided between processes, the key is sent to each process once.
+
+    The data can be encrypted in 2 modes:
+    - "hybrid": HybridCrypt, the data is encrypted with AES-256-GCM and only its key with RSA, the default.
+    - "container": RSACrypt containers, every block is encrypted with RSA, they need a seekable input or output.
+    The plain RSACrypt.crypt_stream blocks are not a mode: they don't keep the length of the data,
+    and the zero bytes at the start of the last decrypted block would be lost.
+
+    Example:
+    > RSATool.crypt("encrypt",public,["a.txt","b.txt"],workers=2)
+    This class has only static methods.
+
+    Raises:
+        RSATool.NotSeekable: a container is decrypted from a pipe.
+        RSATool.UnknownMode: the mode is not one of Modes.
+    """
+    NotSeekable = Exception("A container can be decrypted only from a file, not from a pipe")
+    UnknownMode = Exception("The mode must be hybrid or container")
+    Modes = ("hybrid","container")
+    # the name of the standard input and output
+    Stdio = "-"
+    Suffix = ".rsa"
+
+    @staticmethod
+    def keygen(bits=2048,name=None,algorithm=KeyAlgorithm.LAMBDA,format=KeyFormat.ASCII,priv_file_name="priv.key",pub_file_name="pub.key",crt=False,workers=None,exponent=ExponentPolicy.FIXED,primes=2,generator=PrimeGenerator.BACKEND):
+        """Generate a key pair and write it, see RSA.gen_keys for the arguments.
+
+        Returns:
+            (dict,dict): the private and the public key.
+        """
+        keys = RSA.gen_keys(bits,name,algorithm,crt,workers,exponent,primes,generator)
+        return RSA.writeAndMakeKeys(*keys[:4],format,priv_file_name,pub_file_name,keys[4] if crt else None)
+
+    @staticmethod
+    def convert(source,destination,format,source_format=KeyFormat.AUTO):
+        """Write a key in another format.
+
+        Args:
+            source (str): the key file.
+            destination (str): the new key file.
+            format (KeyFormat | str): the format of the new file.
+            source_format (KeyFormat | str, optional): the format of the key file. Defaults to KeyFormat.AUTO.
+
+        Returns:
+            dict: the key.
+        """
+        return RSA.writeKey(RSA.readKey(source,source_format,cache=False),format,destination)
+
+    @staticmethod
+    def output_name(command,source):
+        """The output file of an input when no output is given:
+        encrypting the suffix is added, decrypting it's removed (or ".out" is added if it's missing).
+
+        Args:
+            command (str): "encrypt" or "decrypt".
+            source (str): the input file.
+
+        Returns:
+            str: the output file.
+        """
+        if source == RSATool.Stdio:
+            return RSATool.Stdio
+        if command == "encrypt":
+            return source + RSATool.Suffix
+        if source.endswith(RSATool.Suffix):
+            return source[:-len(RSATool.Suffix)]
+        return source + ".out"
+
+    @staticmethod
+    def crypt(command,key,sources,destinations=None,mode="hybrid",workers=None):
+        """Encrypt or decrypt some inputs.
+        With one input the workers encrypt its blocks (only in the container mode),
+        with more inputs they are divided between the workers.
+
+        Args:
+            command (str): "encrypt" or "decrypt".
+            key (dict): the key, a public key to encrypt and a private key to decrypt (or the opposite to sign).
+            sources (list): the input files, "-" is the standard input.
+            destinations (list, optional): the output file of every input, "-" is the standard output. Defaults to output_name.
+            mode (str, optional): "hybrid" or "container". Defaults to "hybrid".
+            workers (int, optional): the number of processes. Defaults to None.
+
+        Raises:
+            RSATool.UnknownMode: the mode is not one of Modes.
+
+        Returns:
+            list: a (input, bytes read, bytes written, seconds) tuple for every input.
+        """
+        if mode not in RSATool.Modes:
+            raise RSATool.UnknownMode
+        key = RSACrypt.prepare_key(key,command == "decrypt")
+        destinations = destinations or [RSATool.output_name(command,source) for source in sources]
+        jobs = [(command,mode,source,destination) for source, destination in zip(sources,destinations)]
+        if len(jobs) == 1 or not workers or workers == 1:
+            RSATool._init_worker(key,Backend.name,workers if len(jobs) == 1 else None)
+            return [RSATool._crypt_job(*job) for job in jobs]
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(workers,len(jobs)),initializer=RSATool._init_worker,initargs=(key,Backend.name,None)) as executor:
+            return list(executor.map(RSATool._crypt_job,*zip(*jobs)))
+
+    @staticmethod
+    def _init_worker(key,backend,workers):
+        """Save the key in a worker process, it's the initializer of the process pool.
+
+        Args:
+            key (PreparedKey): the compiled key.
+            backend (str): the name of the Backend.
+            workers (int): the processes each input is divided between.
+        """
+        Backend.use(backend)
+        RSATool._key = key
+        RSATool._workers = workers
+
+    @staticmethod
+    def _crypt_job(command,mode,source,destination):
+        """Encrypt or decrypt an input with the key of the worker process.
+
+        Returns:
+            (str,int,int,float): the input, the bytes read, the bytes written and the seconds.
+        """
+        start = time.perf_counter()
+        reader = source
+        if source == RSATool.Stdio:
+            # a redirected file is used as it is, so it can be seeked, a pipe is counted while it's read
+            reader = sys.stdin.buffer
+            position = reader.tell() if reader.seekable() else 0
+            if not reader.seekable():
+                reader = _CountingReader(reader)
+        writer = sys.stdout.buffer if destination == RSATool.Stdio else destination
+        written = RSATool.__crypt(command,mode,reader,writer)
+        if writer is sys.stdout.buffer:
+            writer.flush()
+        if source != RSATool.Stdio:
+            read = os.path.getsize(source)
+        elif isinstance(reader,_CountingReader):
+            read = reader.count
+        else:
+            read = reader.tell() - position
+        return source, read, written, time.perf_counter() - start
+
+    @staticmethod
+    def __crypt(command,mode,source,destination):
+        """Run a mode on an input.
+
+        Returns:
+            int: the bytes written.
+        """
+        key, workers = RSATool._key, RSATool._workers
+        if mode == "hybrid":
+            if command == "encrypt":
+                return HybridCrypt.encrypt(key,source,destination)
+            return HybridCrypt.decrypt(key,source,destination)
+        if command == "encrypt":
+            return RSACrypt.crypt_to_container(key,source,destination,workers=workers)
+        if hasattr(source,'seekable') and not source.seekable():
+            raise RSATool.NotSeekable
+        return RSACrypt.crypt_from_container(key,source,destination,workers=workers)
+
+    @staticmethod
+    def stats(results,seconds):
+        """Describe the throughput of a run.
+
+        Args:
+            results (list): the results of crypt.
+            seconds (float): the seconds the whole run took.
+
+        Returns:
+            str: a line for every input and one for the total.
+        """
+        lines = []
+        for source, read, written, elapsed in results:
+            lines.append("%s: %d bytes in, %d bytes out, %.3f s, %.2f MB/s" % (source,read,written,elapsed,read/max(elapsed,1e-9)/2**20))
+        read = sum(result[1] for result in results)
+        written = sum(result[2] for result in results)
+        lines.append("total: %d files, %d bytes in, %d bytes out, %.3f s, %.2f MB/s" % (len(results),read,written,seconds,read/max(seconds,1e-9)/2**20))
+        return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m RSATool",description="Generate RSA keys, encrypt and decrypt files and streams, convert keys.")
+    commands = parser.add_subparsers(dest="command",required=True)
+
+    keygen = commands.add_parser("keygen",help="generate a key pair")
+    keygen.add_argument("--bits",type=int,default=2048,help="the length of n")
+    keygen.add_argument("--algorithm",default="LAMBDA",choices=[algorithm.name for algorithm in KeyAlgorithm],help="the function used to generate the key")
+    keygen.add_argument("--format",default="ASCII",help="the format the keys are saved as")
+    keygen.add_argument("--name",default=None,help="the name saved in the metadata")
+    keygen.add_argument("--priv",default="priv.key",help="the private key file")
+    keygen.add_argument("--pub",default="pub.key",help="the public key file")
+    keygen.add_argument("--crt",action="store_true",help="save the CRT parameters in the private key")
+    keygen.add_argument("--exponent",default="FIXED",choices=[policy.name for policy in ExponentPolicy],help="how the encryption exponent is chosen")
+    keygen.add_argument("--primes",type=int,default=2,help="the number of prime factors of n")
+    keygen.add_argument("--generator",default="BACKEND",choices=[generator.name for generator in PrimeGenerator],help="how the primes are generated")
+    keygen.add_argument("-j","--workers",type=int,default=None,help="the number of processes searching the primes")
+
+    for command in ("encrypt","decrypt"):
+        crypt = commands.add_parser(command,help="%s files or the standard input" % command)
+        crypt.add_argument("inputs",nargs="*",default=[RSATool.Stdio],help="the input files, - or nothing is the standard input")
+        crypt.add_argument("-k","--key",required=True,help="the key file")
+        crypt.add_argument("--key-format",default="AUTO",help="the format of the key file, AUTO detects it")
+        crypt.add_argument("-o","--output",default=None,help="the output file of a single input, - is the standard output")
+        crypt.add_argument("--mode",default="hybrid",choices=RSATool.Modes,help="how the data is encrypted")
+        crypt.add_argument("-j","--workers",type=int,default=None,help="the number of processes")
+        crypt.add_argument("--stats",action="store_true",help="print the throughput to the standard error")
+
+    convert = commands.add_parser("convert",help="write a key in another format")
+    convert.add_argument("source",help="the key file")
+    convert.add_argument("destination",help="the new key file")
+    convert.add_argument("--to",required=True,help="the format of the new key file")
+    convert.add_argument("--from",dest="source_format",default="AUTO",help="the format of the key file, AUTO detects it")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "keygen":
+            RSATool.keygen(args.bits,args.name,KeyAlgorithm[args.algorithm],args.format,args.priv,args.pub,args.crt,args.workers,ExponentPolicy[args.exponent],args.primes,PrimeGenerator[args.generator])
+            return 0
+        if args.command == "convert":
+            RSATool.convert(args.source,args.destination,args.to,args.source_format)
+            return 0
+
+        if args.output is not None and len(args.inputs) != 1:
+            parser.error("--output needs a single input")
+        if RSATool.Stdio in args.inputs and len(args.inputs) != 1:
+            parser.error("the standard input can't be mixed with other inputs")
+        sources = args.inputs
+        destinations = [args.output] if args.output is not None else None
+        if destinations is None and sources == [RSATool.Stdio]:
+            destinations = [RSATool.Stdio]
+        key = RSA.readKey(args.key,args.key_format)
+        start = time.perf_counter()
+        results = RSATool.crypt(args.command,key,sources,destinations,args.mode,args.workers)
+        if args.stats:
+            print(RSATool.stats(results,time.perf_counter()-start),file=sys.stderr)
+        return 0
+    except Exception as error:
+        print("%s: %s" % (parser.prog,error),file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+"""Benchmarks for the key generation, the RSACrypt throughput and the KeyIO formats.
+
+Run the benchmarks and save the results:
+> python benchmark.py run -o results.json
+Compare them with a baseline, the exit code is 1 if something is slower than the threshold:
+> python benchmark.py compare baseline.json results.json --threshold 0.1
+Check the import time, the exit code is 1 if an import is too slow or it loads a module that should be lazy:
+> python benchmark.py imports
+Compare the prime generators (getPrime and PrimeSieve) for some key lengths:
+> python benchmark.py primes --bits 1024 2048 4096 8192
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Crypto.Util.number import getPrime
+from RSA import RSA, KeyAlgorithm, ExponentPolicy
+from PrimeSieve import PrimeSieve
+from RSACrypt import RSACrypt
+from HybridCrypt import HybridCrypt
+from KeyIO import KeyFormat
+from Backend import Backend
+
+class Benchmark():
+    """
+    This class runs the benchmarks and compares their results.
+    Every result is a dictionary with the value, the unit and whether a lower or higher value is better.
+    This class has only static methods.
+    """
+    # the number of calls in each repetition of the KeyIO benchmarks, a single read or write is too short to be measured
+    KeyIONumber = 50
+    # the modules whose import time is measured
+    ImportModules = ("KeyIO","RSA","RSACrypt")
+    # the modules that must be imported only when they are used
+    LazyModules = ("json","yaml","base64","gmpy2","concurrent.futures","multiprocessing")
+    # the default maximum import time of each module in milliseconds
+    ImportBudgetMs = 100
+
+    @staticmethod
+    def run(bits=(1024,2048), crypt_bits=2048, payloads=(1024,16384,262144), repeat=3, seed=0, input_size=2**26, slicing_size=2**22):
+        """Run all the benchmarks.
+
+        Args:
+            bits (tuple, optional): the key lengths of the key generation benchmark. Defaults to (1024,2048).
+            crypt_bits (int, optional): the key length of the crypt and KeyIO benchmarks. Defaults to 2048.
+            payloads (tuple, optional): the payload sizes in bytes of the crypt benchmark. Defaults to (1024,16384,262144).
+            repeat (int, optional): the number of times each benchmark is repeated, the median is kept. Defaults to 3.
+            seed (int, optional): the seed of the random module, used for the payloads and the random exponents. Defaults to 0.
+            input_size (int, optional): the size in bytes of the input of the input path benchmark. Defaults to 2**26 (64 MB).
+            slicing_size (int, optional): the size in bytes of the input of the slicing benchmark. Defaults to 2**22 (4 MB).
+
+        Returns:
+            dict: the environment and the results.
+        """
+        random.seed(seed)
+        results = {}
+        results.update(Benchmark.gen_keys(bits,repeat))
+        results.update(Benchmark.packing(bits))
+        results.update(Benchmark.primes(bits,repeat))
+        e, d, n, metadata, crt = RSA.gen_keys(crypt_bits,"benchmark",crt=True,exponent=ExponentPolicy.FIXED)
+        private, public = RSA.makeKeys(e,d,n,metadata,crt)
+        results.update(Benchmark.crypt(private,public,payloads,repeat))
+        results.update(Benchmark.key_io(private,public,repeat))
+        results.update(Benchmark.input_path(public,input_size,repeat))
+        results.update(Benchmark.slicing(public,slicing_size,repeat))
+        results.update(Benchmark.hybrid(private,public,input_size,repeat))
+        results.update(Benchmark.imports(Benchmark.ImportModules,repeat))
+        return {"environment":Benchmark.environment(),"results":results}
+
+    @staticmethod
+    def gen_keys(bits,repeat):
+        """Measure the RSA.gen_keys latency for each key length and KeyAlgorithm.
+
+        Returns:
+            dict: the results.
+        """
+        results = {}
+        for length in bits:
+            for algorithm in KeyAlgorithm:
+                seconds = Benchmark.__measure(lambda: RSA.gen_keys(length,"benchmark",algorithm),repeat)
+                results["gen_keys/%d/%s" % (length,algorithm.name)] = Benchmark.__result(seconds,"s","lower")
+        return results
+
+    @staticmethod
+    def primes(bits,repeat):
+        """Measure the time to generate a prime of half the key length with pycryptodome getPrime and with PrimeSieve,
+        and count the PrimeSieve candidates, sieve hits and full Miller-Rabin tests for each prime.
+        PrimeSieve uses the Backend exponentiation, getPrime always uses the builtin int.
+
+        Returns:
+            dict: the results.
+        """
+        results = {}
+        for length in bits:
+            counters = {}
+            getprime = Benchmark.__measure(lambda: getPrime(length//2),repeat)
+            sieve = Benchmark.__measure(lambda: PrimeSieve.get_prime(length//2,counters=counters),repeat)
+            results["primes/%d/getPrime" % length] = Benchmark.__result(getprime,"s","lower")
+            results["primes/%d/PrimeSieve" % length] = Benchmark.__result(sieve,"s","lower")
+            for name, value in counters.items():
+                results["primes/%d/%s" % (length,name.replace(" ","-"))] = Benchmark.__result(value/repeat,"per prime","lower")
+        return results
+
+    @staticmethod
+    def packing(bits,samples=10000):
+        """Count the exponentiations needed to encrypt a MB with the blocks of RSACrypt.block_geometry (after),
+        and with the old blocks taken from the metadata length, or log2(n) without it (before).
+        A generated n can be a bit shorter than the requested length, then the old blocks can be bigger than n:
+        the share of random old blocks that are not smaller than n is the unsafe result.
+
+        Args:
+            bits (tuple): the key lengths.
+            samples (int, optional): the random blocks checked for the unsafe result. Defaults to 10000.
+
+        Returns:
+            dict: the results.
+        """
+        results = {}
+        for length in bits:
+            e, d, n, metadata = RSA.gen_keys(length,"benchmark")[:4]
+            public = RSA.makeKeys(e,d,n,metadata)[1]
+            before = (metadata['length'] if metadata['length'] else int(math.log2(n))) // 8
+            after = RSACrypt.block_geometry(public)[0]
+            unsafe = sum(random.getrandbits(8*before) >= n for _ in range(samples)) / samples
+            results["packing/%d/before" % length] = Benchmark.__result(-(-2**20 // before),"exp/MB","lower")
+            results["packing/%d/after" % length] = Benchmark.__result(-(-2**20 // after),"exp/MB","lower")
+            results["packing/%d/unsafe-before" % length] = Benchmark.__result(unsafe,"share","lower")
+        return results
+
+    @staticmethod
+    def crypt(private,public,payloads,repeat):
+        """Measure the RSACrypt.crypt_bytes throughput with the public key, the private key and the private key with CRT.
+
+        Returns:
+            dict: the results.
+        """
+        keys = {
+            "public":RSACrypt.prepare_key(public),
+            "private":RSACrypt.prepare_key({k:v for k,v in private.items() if k != 'crt'}),
+            "private-crt":RSACrypt.prepare_key(private)
+        }
+        results = {}
+        for size in payloads:
+            payload = random.randbytes(size)
+            for name, key in keys.items():
+                seconds = Benchmark.__measure(lambda: RSACrypt.crypt_bytes(key,payload),repeat)
+                blocks = -(-size // RSACrypt.block_geometry(key)[0])
+                results["crypt/%s/%d/MBps" % (name,size)] = Benchmark.__result(size/seconds/2**20,"MB/s","higher")
+                results["crypt/%s/%d/ops" % (name,size)] = Benchmark.__result(blocks/seconds,"blocks/s","higher")
+        return results
+
+    @staticmethod
+    def key_io(private,public,repeat):
+        """Measure the time to write and read a key pair in every KeyFormat.
+
+        Returns:
+            dict: the results.
+        """
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            priv_file = os.path.join(directory,"priv.key")
+            pub_file = os.path.join(directory,"pub.key")
+            for format in KeyFormat:
+                if format == KeyFormat.AUTO:
+                    continue
+                write = Benchmark.__measure(lambda: RSA.writeKeys((private,public),format,priv_file,pub_file),repeat,Benchmark.KeyIONumber)
+                read = Benchmark.__measure(lambda: RSA.readKeys(priv_file,pub_file,format,cache=False),repeat,Benchmark.KeyIONumber)
+                results["keyio/%s/write" % format.name] = Benchmark.__result(write,"s","lower")
+                results["keyio/%s/read" % format.name] = Benchmark.__result(read,"s","lower")
+        return results
+
+    @staticmethod
+    def input_path(public,size,repeat):
+        """Measure the time and the peak memory RSACrypt.crypt_bytes and crypt_file (with and without mmap) take
+        to divide a big input in blocks and join the result.
+        The key has exponent 1, so the exponentiations cost almost nothing and only the input and output handling is measured.
+        The peak memory is the one traced by tracemalloc, so it doesn't include the memory mapped file.
+
+        Returns:
+            dict: the results.
+        """
+        key = RSACrypt.prepare_key(dict(public,**{"key exponent":1}))
+        payload = random.randbytes(size)
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory,"input")
+            with open(file_name,"wb") as file:
+                file.write(payload)
+            functions = {
+                "bytes":lambda: RSACrypt.crypt_bytes(key,payload),
+                "file":lambda: RSACrypt.crypt_file(key,file_name),
+                "file-mmap":lambda: RSACrypt.crypt_file(key,file_name,mmap=True)
+            }
+            for name, function in functions.items():
+                seconds = Benchmark.__measure(function,repeat)
+                tracemalloc.start()
+                try:
+                    function()
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                results["input/%s/MBps" % name] = Benchmark.__result(size/seconds/2**20,"MB/s","higher")
+                results["input/%s/peak" % name] = Benchmark.__result(peak/2**20,"MB","lower")
+        return results
+
+    @staticmethod
+    def slicing(public,size,repeat):
+        """Compare the old crypt_bytes input path, that sliced the rest of the message after every block
+        and joined the result with +=, with the memoryview slices of crypt_bytes and the memory mapped file of crypt_file.
+        The old path copies the whole message for every block, so the input is smaller than the input path one.
+        The key has exponent 1 and the peak memory is measured as in input_path.
+
+        Returns:
+            dict: the results.
+        """
+        key = RSACrypt.prepare_key(dict(public,**{"key exponent":1}))
+        payload = random.randbytes(size)
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory,"input")
+            with open(file_name,"wb") as file:
+                file.write(payload)
+            functions = {
+                "old":lambda: Benchmark.__sliced_crypt(key,payload),
+                "memoryview":lambda: RSACrypt.crypt_bytes(key,payload),
+                "mmap":lambda: RSACrypt.crypt_file(key,file_name,mmap=True)
+            }
+            for name, function in functions.items():
+                seconds = Benchmark.__measure(function,repeat)
+                tracemalloc.start()
+                try:
+                    function()
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                results["slicing/%s/MBps" % name] = Benchmark.__result(size/seconds/2**20,"MB/s","higher")
+                results["slicing/%s/peak" % name] = Benchmark.__result(peak/2**20,"MB","lower")
+        return results
+
+    @staticmethod
+    def hybrid(private,public,size,repeat):
+        """Measure the HybridCrypt throughput, encrypting with the public key and decrypting with the private one.
+
+        Returns:
+            dict: the results.
+        """
+        payload = random.randbytes(size)
+        container = HybridCrypt.encrypt_bytes(public,payload)
+        encrypt = Benchmark.__measure(lambda: HybridCrypt.encrypt_bytes(public,payload),repeat)
+        decrypt = Benchmark.__measure(lambda: HybridCrypt.decrypt_bytes(private,container),repeat)
+        return {
+            "hybrid/encrypt/MBps":Benchmark.__result(size/encrypt/2**20,"MB/s","higher"),
+            "hybrid/decrypt/MBps":Benchmark.__result(size/decrypt/2**20,"MB/s","higher")
+        }
+
+    @staticmethod
+    def imports(modules,repeat):
+        """Measure the import time of the modules, each one in a new interpreter.
+
+        Returns:
+            dict: the results.
+        """
+        results = {}
+        for module in modules:
+            seconds = statistics.median(Benchmark.import_module(module)[0] for _ in range(repeat))
+            results["import/%s" % module] = Benchmark.__result(seconds,"s","lower")
+        return results
+
+    @staticmethod
+    def import_module(module):
+        """Import a module in a new interpreter.
+
+        Args:
+            module (str): the module name.
+
+        Returns:
+            (float,list): the seconds the import took, and the LazyModules it loaded.
+        """
+        script = (
+            "import sys,time\n"
+            "start = time.perf_counter()\n"
+            "import %s\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(name for name in %r if name in sys.modules))\n"
+        ) % (module,Benchmark.LazyModules)
+        output = subprocess.run(
+            [sys.executable,"-c",script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,text=True,check=True
+        ).stdout.split("\n")
+        return float(output[0]), output[1].split()
+
+    @staticmethod
+    def environment():
+        """The information about the machine the benchmarks are run on.
+
+        Returns:
+            dict: the environment.
+        """
+        try:
+            from Crypto import __version__ as pycryptodome
+        except ImportError:
+            pycryptodome = "Unknown"
+        return {
+            "python":sys.version,
+            "implementation":platform.python_implementation(),
+            "platform":platform.platform(),
+            "machine":platform.machine(),
+            "cpus":os.cpu_count(),
+            "pycryptodome":pycryptodome,
+            "backend":Backend.name,
+            "time":time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        }
+
+    @staticmethod
+    def compare(baseline,current,threshold=0.1):
+        """Compare 2 benchmark runs.
+
+        Args:
+            baseline (dict): the results of the baseline run.
+            current (dict): the results of the current run.
+            threshold (float, optional): the relative change over which a result is a regression. Defaults to 0.1.
+
+        Returns:
+            list: a (name, baseline value, current value, relative change, is regression) tuple for every common result,
+                  the change is positive when the current value is better.
+        """
+        comparison = []
+        for name, result in current['results'].items():
+            if name not in baseline['results']:
+                continue
+            old = baseline['results'][name]['value']
+            new = result['value']
+            if old == 0:
+                continue
+            change = (new - old) / old
+            if result['better'] == "lower":
+                change = -change
+            comparison.append((name,old,new,change,change < -threshold))
+        return comparison
+
+    @staticmethod
+    def __measure(function,repeat,number=1):
+        """The median time of a function.
+        Each repetition calls the function number times, so that short functions can be measured.
+
+        Returns:
+            float: the median seconds of a single call.
+        """
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            times.append((time.perf_counter() - start) / number)
+        return statistics.median(times)
+
+    @staticmethod
+    def __sliced_crypt(key,message):
+        """The old crypt_bytes loop, for the slicing benchmark (with the blocks of the current geometry).
+
+        Returns:
+            bytes: the encrypted message.
+        """
+        chunk, width = RSACrypt.block_geometry(key)
+        block = message[0:chunk]
+        result = b''
+        while block:
+            result += Backend.to_bytes(RSACrypt.crypt_int(key,Backend.from_bytes(block)),width)
+            message = message[chunk:]
+            block = message[0:chunk]
+        return result
+
+    @staticmethod
+    def __result(value,unit,better):
+        return {"value":value,"unit":unit,"better":better}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the RSA modules.")
+    commands = parser.add_subparsers(dest="command",required=True)
+
+    run = commands.add_parser("run",help="run the benchmarks")
+    run.add_argument("-o","--output",help="the JSON file the results are saved to")
+    run.add_argument("--bits",type=int,nargs="+",default=[1024,2048],help="the key lengths of the key generation benchmark")
+    run.add_argument("--crypt-bits",type=int,default=2048,help="the key length of the crypt and KeyIO benchmarks")
+    run.add_argument("--payloads",type=int,nargs="+",default=[1024,16384,262144],help="the payload sizes in bytes")
+    run.add_argument("--repeat",type=int,default=3,help="the number of repetitions, the median is kept")
+    run.add_argument("--seed",type=int,default=0,help="the seed of the random module")
+    run.add_argument("--input-size",type=int,default=2**26,help="the size in bytes of the input path benchmark input")
+    run.add_argument("--slicing-size",type=int,default=2**22,help="the size in bytes of the slicing benchmark input")
+    run.add_argument("--quick",action="store_true",help="small keys and payloads, to check the harness works")
+
+    primes = commands.add_parser("primes",help="compare the prime generators")
+    primes.add_argument("--bits",type=int,nargs="+",default=[1024,2048,4096,8192],help="the key lengths, the primes are half as long")
+    primes.add_argument("--repeat",type=int,default=5,help="the number of repetitions, the median is kept")
+
+    imports = commands.add_parser("imports",help="check the import time of the modules")
+    imports.add_argument("--max-ms",type=float,default=Benchmark.ImportBudgetMs,help="the maximum import time of each module in milliseconds")
+    imports.add_argument("--repeat",type=int,default=5,help="the number of repetitions, the median is kept")
+
+    compare = commands.add_parser("compare",help="compare the results with a baseline")
+    compare.add_argument("baseline",help="the JSON file of the baseline results")
+    compare.add_argument("current",help="the JSON file of the current results")
+    compare.add_argument("--threshold",type=float,default=0.1,help="the relative slowdown that's a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        if args.quick:
+            args.bits, args.crypt_bits, args.payloads, args.repeat, args.input_size, args.slicing_size = [512], 1024, [1024], 1, 2**20, 2**18
+        results = Benchmark.run(args.bits,args.crypt_bits,args.payloads,args.repeat,args.seed,args.input_size,args.slicing_size)
+        for name, result in results['results'].items():
+            print("%-40s %14.6g %s" % (name,result['value'],result['unit']))
+        if args.output:
+            with open(args.output,"w") as file:
+                json.dump(results,file,indent=2)
+        return 0
+
+    if args.command == "primes":
+        for name, result in Benchmark.primes(args.bits,args.repeat).items():
+            print("%-40s %14.6g %s" % (name,result['value'],result['unit']))
+        return 0
+
+    if args.command == "imports":
+        failures = 0
+        for module in Benchmark.ImportModules:
+            seconds = statistics.median(Benchmark.import_module(module)[0] for _ in range(args.repeat))
+            eager = Benchmark.import_module(module)[1]
+            slow = seconds*1000 > args.max_ms
+            failures += slow or bool(eager)
+            print("%-10s %8.1f ms %s%s" % (module,seconds*1000,"TOO SLOW " if slow else "",
+                "eager imports: " + ", ".join(eager) if eager else ""))
+        return 1 if failures else 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    regressions = 0
+    for name, old, new, change, regression in Benchmark.compare(baseline,current,args.threshold):
+        regressions += regression
+        print("%-40s %14.6g %14.6g %+8.1f%% %s" % (name,old,new,change*100,"REGRESSION" if regression else ""))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
+from Backend import Backend
+
+# the bit length over which euclidean uses the Backend gcd
+LEHMER_THRESHOLD = 64
 
 def extended_euclidean(a,b):
 	"""Calculate GCD(a,b) with the extended Euclidean algorithm.
@@ -37,10 +41,121 @@ def euclidean(a,b):
 	Returns:
 		Integer: GCD(a,b) = m ∈ ℕ : (m|a ⋀ m|b) ⋀ (∄ n ∈ ℕ : (n|a ⋀ n|b) ⋀ n>m).
 	"""
+	a, b = abs(a), abs(b)
+	if max(a,b).bit_length() > LEHMER_THRESHOLD:
+		# for big operands math.gcd is much faster, CPython implements it with Lehmer's algorithm
+		# (or GMP's gcd with the gmpy2 backend)
+		# see more: https://en.wikipedia.org/wiki/Lehmer%27s_GCD_algorithm
+		return Backend.gcd(a,b)
+
 	if(a<b):
 		a,b = b,a
 
-	a, b = abs(a), abs(b)
 	while a != 0:
 		a, b = b % a, a
-	return b
\ No newline at end of file
+	return b
+
+def modular_inverse(a,m):
+	"""Calculate the inverse of a mod m with the Backend modular inverse (pow(a,-1,m) or gmpy2.invert).
+	It's the same value of the extended Euclidean algorithm s coefficient, but always in [0, m).
+
+	Args:
+		a (Integer): an integer coprime with m.
+		m (Integer): an integer > 1.
+
+	Raises:
+		ValueError: a is not invertible mod m.
+
+	Returns:
+		Integer: x such that ax ≡ 1 (mod m).
+	"""
+	return Backend.invert(a, m)
+
+def batch_inverse(values,m):
+	"""Calculate the inverse mod m of many values with a single modular inversion (Montgomery's trick).
+	The prefix products of the values are inverted once, and then the single inverses are
+	recovered going backwards with 2 multiplications each.
+	see more: https://en.wikipedia.org/wiki/Modular_multiplicative_inverse#Multiple_inverses
+
+	Args:
+		values (list): integers coprime with m.
+		m (Integer): an integer > 1, the same for every value.
+
+	Raises:
+		ValueError: a value is not invertible mod m.
+
+	Returns:
+		list: the inverses, in the same order of the values.
+	"""
+	values = list(values)
+	if not values:
+		return []
+	# prefixes[i] = values[0]*...*values[i] mod m
+	prefixes = []
+	product = 1
+	for value in values:
+		product = product * value % m
+		prefixes.append(product)
+
+	inverse = modular_inverse(product, m)
+	inverses = [0] * len(values)
+	for i in range(len(values) - 1, 0, -1):
+		inverses[i] = inverse * prefixes[i - 1] % m
+		inverse = inverse * values[i] % m
+	inverses[0] = inverse
+	return inverses
+
+def product_tree(values):
+	"""Build the product tree of the values: every node is the product of its 2 children.
+	The numbers are Backend.integer values, so with gmpy2 the big products use GMP.
+	see more: https://facthacks.cr.yp.to/product.html
+
+	Args:
+		values (list): integers > 0.
+
+	Returns:
+		list: the levels of the tree, the first one is the values and the last one has only the product of all of them.
+	"""
+	level = [Backend.integer(value) for value in values]
+	tree = [level]
+	while len(level) > 1:
+		level = [level[i] * level[i + 1] if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+		tree.append(level)
+	return tree
+
+def remainders_squared(tree, value):
+	"""Calculate value mod x² for every x in the first level of a product tree,
+	going down the tree so that each remainder is taken from the (smaller) remainder of the parent.
+	see more: https://facthacks.cr.yp.to/remainder.html
+
+	Args:
+		tree (list): a product tree (see product_tree).
+		value (Integer): an integer >= 0.
+
+	Returns:
+		list: the remainders, in the same order of the first level.
+	"""
+	root = tree[-1][0]
+	remainders = [value % (root * root)]
+	for level in reversed(tree[:-1]):
+		remainders = [remainders[i // 2] % (node * node) for i, node in enumerate(level)]
+	return remainders
+
+def batch_gcd(moduli):
+	"""Calculate GCD(n, product of the other moduli) for every modulus n, with Bernstein's batch GCD:
+	the product P of all the moduli is reduced mod n² with a remainder tree, and GCD(n, (P mod n²)/n) is
+	the GCD of n with the product of the others. It's quasi-linear, instead of the N² of comparing every pair.
+	A result different from 1 means that the modulus shares a factor with another one (n if they are equal).
+	see more: https://facthacks.cr.yp.to/batchgcd.html
+
+	Args:
+		moduli (list): integers > 1.
+
+	Returns:
+		list: the GCDs, in the same order of the moduli.
+	"""
+	if not moduli:
+		return []
+	tree = product_tree(moduli)
+	remainders = remainders_squared(tree, tree[-1][0])
+	return [Backend.gcd(remainder // n, n) for remainder, n in zip(remainders, tree[0])]
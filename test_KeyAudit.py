@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from Backend import Backend
+from euclidean_algorithm import modular_inverse
+from KeyAudit import KeyAudit
+from RSA import RSA
+
+class KeyAuditTest(unittest.TestCase):
+    """
+    The shared modulus findings, for keys of different files with the same n,
+    and the shared factor findings of the batch GCD.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.primes = [Backend.get_prime(256) for _ in range(5)]
+
+    @staticmethod
+    def write_pair(directory,name,p,q):
+        n = p*q
+        e = 65537
+        d = modular_inverse(e,(p-1)*(q-1))
+        keys = RSA.makeKeys(e,d,n,{"name":name,"algorithm":"Unknown","length":n.bit_length()})
+        RSA.writeKeys(keys,"ASCII",os.path.join(directory,name+".priv"),os.path.join(directory,name+".pub"))
+        return n
+
+    def test_shared_modulus(self):
+        p, q, r, s, t = self.primes
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as other:
+            shared = self.write_pair(directory,"alice",p,q)
+            self.write_pair(other,"bob",p,q)
+            self.write_pair(directory,"carol",r,s)
+            moduli = KeyAudit.merge(KeyAudit.load_directory(directory),KeyAudit.load_directory(other))
+            findings = KeyAudit.audit(moduli)
+
+        # the private and public key of alice alone are a pair, with bob's keys n is shared
+        self.assertEqual(len(findings),1)
+        finding = findings[0]
+        self.assertEqual(finding['finding'],"shared modulus")
+        self.assertEqual(finding['mod n'],shared)
+        self.assertEqual(sorted(os.path.basename(source) for source in finding['keys']),
+                         ["alice.priv (private key)","alice.pub (public key)","bob.priv (private key)","bob.pub (public key)"])
+
+    def test_is_shared(self):
+        self.assertFalse(KeyAudit.is_shared(["a (private key)"]))
+        self.assertFalse(KeyAudit.is_shared(["a (private key)","a.pub (public key)"]))
+        self.assertFalse(KeyAudit.is_shared(["a (public key)","a (public key)"]))
+        self.assertTrue(KeyAudit.is_shared(["a (public key)","b (public key)"]))
+        self.assertTrue(KeyAudit.is_shared(["a","b"]))
+        self.assertTrue(KeyAudit.is_shared(["a (private key)","a.pub (public key)","b (public key)"]))
+
+    def test_shared_factor(self):
+        p, q, r, s, t = self.primes
+        findings = KeyAudit.audit({p*q:["a (public key)"],p*r:["b (public key)"],s*t:["c (public key)"]},shard_size=2)
+        self.assertEqual(sorted((finding['finding'],finding['factor']) for finding in findings),[("shared factor",p)]*2)
+        self.assertEqual(sorted(source for finding in findings for source in finding['keys']),["a (public key)","b (public key)"])
+
+if __name__ == "__main__":
+    unittest.main()
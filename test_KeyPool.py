@@ -0,0 +1,48 @@
+import json
+import os
+import stat
+import tempfile
+import unittest
+from KeyPool import KeyPool
+from RSA import RSA, KeyAlgorithm
+
+class KeyPoolTest(unittest.TestCase):
+    """
+    The persist file of the unissued keys.
+    """
+    def setUp(self):
+        self.umask = os.umask(0o022)
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name,"pool.json")
+
+    def tearDown(self):
+        os.umask(self.umask)
+        self.directory.cleanup()
+
+    def mode(self):
+        return stat.S_IMODE(os.stat(self.file_name).st_mode)
+
+    @unittest.skipIf(os.name != "posix","the file mode is POSIX only")
+    def test_persist_file_is_private(self):
+        keys = RSA.gen_keys(512,None,KeyAlgorithm.LAMBDA,True)
+        with open(self.file_name,"w") as file:
+            json.dump([{"bits":512,"algorithm":"LAMBDA","keys":list(keys)}],file)
+        os.chmod(self.file_name,0o644)
+
+        # low=0 and high=0: nothing is generated in the background
+        pool = KeyPool([(512,KeyAlgorithm.LAMBDA)],low=0,high=0,workers=1,persist_file=self.file_name)
+        # the loaded keys are removed from the file
+        self.assertEqual(self.mode(),0o600)
+        with open(self.file_name) as file:
+            self.assertEqual(json.load(file),[])
+        pool.close()
+
+        self.assertEqual(self.mode(),0o600)
+        with open(self.file_name) as file:
+            data = json.load(file)
+        self.assertEqual(len(data),1)
+        self.assertEqual(data[0]['keys'][2],keys[2])
+        self.assertFalse(os.path.exists(self.file_name + ".tmp"))
+
+if __name__ == "__main__":
+    unittest.main()
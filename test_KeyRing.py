@@ -0,0 +1,65 @@
+import os
+import random
+import tempfile
+import unittest
+from KeyRing import KeyRing
+from RSA import RSA
+
+class KeyRingTest(unittest.TestCase):
+    """
+    The key ring file: lookups, crash safety and size.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name,"keys.ring")
+        self.random = random.Random(1234)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def key(self,name):
+        """A key with random 2048 bits values, the key ring doesn't check them.
+        """
+        return RSA.makeKey(self.random.getrandbits(2048),self.random.getrandbits(2048),{"name":name,"algorithm":"Unknown","length":2048},"public key")
+
+    def test_append_and_lookup(self):
+        keys = [self.key("key%d" % i) for i in range(5)]
+        with KeyRing(self.file_name) as ring:
+            ring.append(*keys[:3])
+            ring.append(*keys[3:])
+            ring.remove("key1")
+        with KeyRing(self.file_name) as ring:
+            self.assertEqual(len(ring),4)
+            self.assertEqual(ring.get_by_name("key4"),keys[4])
+            self.assertEqual(list(ring),[keys[0]]+keys[2:])
+
+    def test_interrupted_append(self):
+        keys = [self.key("key%d" % i) for i in range(3)]
+        with KeyRing(self.file_name) as ring:
+            ring.append(*keys[:2])
+        # the new key is written after the end, but the header still points to the old index
+        with open(self.file_name,"ab") as file:
+            file.write(b"\xff" * 1000)
+        with KeyRing(self.file_name) as ring:
+            self.assertEqual(list(ring),keys[:2])
+            ring.append(keys[2])
+        with KeyRing(self.file_name) as ring:
+            self.assertEqual(list(ring),keys)
+
+    def test_size_stays_bounded(self):
+        keys = [self.key("key%d" % i) for i in range(400)]
+        sizes = []
+        with KeyRing(self.file_name) as ring:
+            for key in keys:
+                ring.append(key)
+                sizes.append(os.path.getsize(self.file_name))
+            ring.remove("key0")
+            ring.compact()
+            live = os.path.getsize(self.file_name)
+            self.assertEqual(len(ring),399)
+            self.assertEqual(ring.get_by_name("key123"),keys[123])
+        # without the automatic compaction the 400 indexes alone would be about 4 MB
+        self.assertLessEqual(max(sizes),2*live + KeyRing.CompactMinSize)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from RSA import RSA
+
+class RSATest(unittest.TestCase):
+    """
+    The arguments of the key generation.
+    """
+    def test_divide_workers(self):
+        for count in range(1,6):
+            for workers in range(1,10):
+                with self.subTest(count=count,workers=workers):
+                    processes = RSA._divide_workers(count,workers)
+                    # exactly workers processes, and every prime is searched
+                    self.assertEqual(len(processes),workers)
+                    self.assertEqual(sorted(set(slot for slots in processes for slot in slots)),list(range(count)))
+        self.assertEqual(RSA._divide_workers(2,3),[(0,),(0,),(1,)])
+
+    def test_primes_at_least_2(self):
+        for primes in (0,1,-2,2.0,"3",True):
+            with self.subTest(primes=primes):
+                with self.assertRaises(ValueError):
+                    RSA.gen_keys(512,primes=primes)
+
+    def test_exponent_odd_and_at_least_3(self):
+        for exponent in (-3,1,2,4,65536):
+            with self.subTest(exponent=exponent):
+                with self.assertRaises(Exception) as context:
+                    RSA.gen_keys(512,exponent=exponent)
+                self.assertIs(context.exception,RSA.InvalidExponent)
+
+    def test_multi_prime_length(self):
+        for primes in (3,4):
+            with self.subTest(primes=primes):
+                e, d, n, metadata = RSA.gen_keys(1024,primes=primes)
+                self.assertEqual(n.bit_length(),1024)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import asyncio
+import io
+import os
+import random
+import tempfile
+import unittest
+from AsyncCrypt import AsyncCrypt
+from Backend import Backend
+from euclidean_algorithm import euclidean, modular_inverse
+from RSA import RSA
+from RSACrypt import RSACrypt
+
+class RSACryptTest(unittest.TestCase):
+    """
+    The round trips of the RSACrypt blocks, whose sizes depend only on n (see RSACrypt.block_geometry):
+    odd bit lengths, wrong or unknown metadata, unknown key types, plaintext blocks that start with zeros
+    and the workers, mmap and async paths, that must give the same bytes of the serial one.
+    """
+    # 1024 fills its bytes, the others leave 1 or 7 bits of the last byte unused
+    Lengths = (521,1023,1024,1025)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.random = random.Random(1234)
+        cls.keys = {bits:RSACryptTest.__gen_keys(bits) for bits in RSACryptTest.Lengths}
+
+    @staticmethod
+    def __gen_keys(bits):
+        """A key pair whose n is exactly bits long (gen_keys can make n a bit shorter).
+        """
+        e = 65537
+        while True:
+            p, q = Backend.get_prime(bits//2), Backend.get_prime(bits - bits//2)
+            n = p*q
+            phi = (p-1)*(q-1)
+            if p != q and n.bit_length() == bits and euclidean(e,phi) == 1:
+                return RSA.makeKeys(e,modular_inverse(e,phi),n,{"name":"test","algorithm":"Unknown","length":bits})
+
+    def message(self,length,zeros=()):
+        """Random bytes with no zero byte, except in the given positions.
+        """
+        data = bytearray(self.random.randint(1,255) for _ in range(length))
+        for position in zeros:
+            data[position] = 0
+        return bytes(data)
+
+    def round_trip(self,priv,pub,message):
+        encrypted = RSACrypt.crypt_bytes(pub,message)
+        return encrypted, RSACrypt.crypt_bytes(priv,encrypted)
+
+    def test_odd_bit_lengths(self):
+        for bits, (priv, pub) in self.keys.items():
+            width = (bits+7) // 8
+            chunk = (bits-1) // 8
+            self.assertEqual(RSACrypt.block_geometry(pub),(chunk,width))
+            self.assertEqual(RSACrypt.block_geometry(priv),(width,chunk))
+            for length in (0,1,chunk-1,chunk,chunk+1,3*chunk+5):
+                with self.subTest(bits=bits,length=length):
+                    message = self.message(length)
+                    encrypted, decrypted = self.round_trip(priv,pub,message)
+                    self.assertEqual(len(encrypted),-(-length // chunk) * width)
+                    self.assertLessEqual(len(encrypted),RSACrypt.output_size(pub,length))
+                    self.assertEqual(decrypted,message)
+
+    def test_block_bigger_than_metadata_length(self):
+        # a block of metadata length bytes can be bigger than n, it's never used
+        priv, pub = self.keys[1023]
+        message = b"\xff" * 500
+        self.assertEqual(self.round_trip(priv,pub,message)[1],message)
+
+    def test_wrong_or_unknown_metadata(self):
+        priv, pub = self.keys[1025]
+        message = self.message(1000)
+        expected = RSACrypt.crypt_bytes(pub,message)
+        for metadata in ({"name":"x","algorithm":"Unknown","length":4096},
+                         {"name":"x","algorithm":"Unknown","length":512},
+                         {"name":"x","algorithm":"Unknown","length":"Unknown"},
+                         "Unknown"):
+            with self.subTest(metadata=metadata):
+                wrong_priv = dict(priv,metadata=metadata)
+                wrong_pub = dict(pub,metadata=metadata)
+                self.assertEqual(RSACrypt.block_geometry(wrong_pub),RSACrypt.block_geometry(pub))
+                encrypted, decrypted = self.round_trip(wrong_priv,wrong_pub,message)
+                self.assertEqual(encrypted,expected)
+                self.assertEqual(decrypted,message)
+
+    def test_unknown_type_needs_direction(self):
+        priv, pub = self.keys[1024]
+        message = self.message(300)
+        unknown_priv = RSA.makeKey(priv['key exponent'],priv['mod n'])
+        unknown_pub = RSA.makeKey(pub['key exponent'],pub['mod n'])
+        for function in (lambda: RSACrypt.crypt_bytes(unknown_priv,message),
+                         lambda: RSACrypt.crypt_string(unknown_pub,"message"),
+                         lambda: RSACrypt.output_size(unknown_pub,10),
+                         lambda: RSACrypt.block_geometry(unknown_priv),
+                         lambda: list(RSACrypt.iter_crypt(unknown_pub,message)),
+                         lambda: RSACrypt.crypt_stream(unknown_pub,message,io.BytesIO())):
+            with self.assertRaises(Exception) as context:
+                function()
+            self.assertIs(context.exception,RSACrypt.UnknownDirection)
+
+        encrypted = RSACrypt.crypt_bytes(RSACrypt.prepare_key(unknown_pub,decrypt=False),message)
+        self.assertEqual(encrypted,RSACrypt.crypt_bytes(pub,message))
+        self.assertEqual(RSACrypt.crypt_bytes(RSACrypt.prepare_key(unknown_priv,decrypt=True),encrypted),message)
+
+    def test_raw_and_hex_keys(self):
+        priv, pub = self.keys[1025]
+        message = self.message(400)
+        with tempfile.TemporaryDirectory() as directory:
+            for format in ("RAW","HEX"):
+                with self.subTest(format=format):
+                    RSA.writeKey(priv,format,os.path.join(directory,"priv"))
+                    RSA.writeKey(pub,format,os.path.join(directory,"pub"))
+                    read_priv = RSA.readKey(os.path.join(directory,"priv"),format,cache=False)
+                    read_pub = RSA.readKey(os.path.join(directory,"pub"),format,cache=False)
+                    with self.assertRaises(Exception) as context:
+                        RSACrypt.crypt_bytes(read_priv,RSACrypt.crypt_bytes(pub,message))
+                    self.assertIs(context.exception,RSACrypt.UnknownDirection)
+                    encrypted = RSACrypt.crypt_bytes(RSACrypt.prepare_key(read_pub,decrypt=False),message)
+                    self.assertEqual(RSACrypt.crypt_bytes(RSACrypt.prepare_key(read_priv,decrypt=True),encrypted),message)
+
+    def test_leading_zero_blocks(self):
+        for bits, (priv, pub) in self.keys.items():
+            chunk = RSACrypt.block_geometry(pub)[0]
+            with self.subTest(bits=bits):
+                # every block but the last starts with zeros, one is all zeros
+                message = self.message(4*chunk+3,zeros=list(range(0,2))+list(range(chunk,2*chunk))+[2*chunk,3*chunk])
+                self.assertEqual(self.round_trip(priv,pub,message)[1],message)
+
+                # the length of the last block is not known, its leading zeros are removed
+                message = self.message(2*chunk+3,zeros=(2*chunk,2*chunk+1))
+                self.assertEqual(self.round_trip(priv,pub,message)[1],message[:2*chunk]+message[2*chunk+2:])
+
+                # a container keeps the length
+                container = io.BytesIO()
+                RSACrypt.crypt_to_container(pub,message,container)
+                container.seek(0)
+                decrypted = io.BytesIO()
+                RSACrypt.crypt_from_container(priv,container,decrypted)
+                self.assertEqual(decrypted.getvalue(),message)
+
+    def batch_message(self,chunk):
+        """A message of more than 2 worker batches, the blocks at the batch boundaries start with zeros.
+        """
+        batch = RSACrypt.WorkerBatch * chunk
+        zeros = [batch-chunk,batch-chunk+1,batch,2*batch-chunk,2*batch]
+        return self.message(2*batch+5*chunk+7,zeros=zeros)
+
+    def test_workers(self):
+        priv, pub = self.keys[521]
+        message = self.batch_message(RSACrypt.block_geometry(pub)[0])
+        encrypted = RSACrypt.crypt_bytes(pub,message)
+        self.assertEqual(RSACrypt.crypt_bytes(pub,message,workers=2),encrypted)
+        self.assertEqual(RSACrypt.crypt_bytes(priv,encrypted,workers=2),message)
+        output = io.BytesIO()
+        RSACrypt.crypt_stream(priv,encrypted,output,workers=2)
+        self.assertEqual(output.getvalue(),message)
+
+    def test_mmap(self):
+        priv, pub = self.keys[1023]
+        message = self.batch_message(RSACrypt.block_geometry(pub)[0])
+        encrypted = RSACrypt.crypt_bytes(pub,message)
+        with tempfile.TemporaryDirectory() as directory:
+            plain_name = os.path.join(directory,"plain")
+            encrypted_name = os.path.join(directory,"encrypted")
+            with open(plain_name,"wb") as file:
+                file.write(message)
+            with open(encrypted_name,"wb") as file:
+                file.write(encrypted)
+            self.assertEqual(RSACrypt.crypt_file(pub,plain_name,mmap=True),encrypted)
+            self.assertEqual(RSACrypt.crypt_file(priv,encrypted_name,mmap=True),message)
+            self.assertEqual(RSACrypt.crypt_file(priv,encrypted_name),message)
+            output = io.BytesIO()
+            with open(encrypted_name,"rb") as file:
+                RSACrypt.crypt_stream(priv,file,output,mmap=True)
+            self.assertEqual(output.getvalue(),message)
+
+    def test_async_batch_boundaries(self):
+        priv, pub = self.keys[521]
+        message = self.batch_message(RSACrypt.block_geometry(pub)[0])
+        encrypted = RSACrypt.crypt_bytes(pub,message)
+
+        async def chunks(data,size):
+            for position in range(0,len(data),size):
+                yield data[position:position+size]
+
+        async def crypt(key,data):
+            output = io.BytesIO()
+            # chunks that don't match the blocks nor the batches
+            await AsyncCrypt.crypt_stream(key,chunks(data,1000),output)
+            return output.getvalue()
+
+        self.assertEqual(asyncio.run(crypt(pub,message)),encrypted)
+        self.assertEqual(asyncio.run(crypt(priv,encrypted)),message)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from RSATool import RSATool, main
+
+class RSAToolTest(unittest.TestCase):
+    """
+    The command line round trips, on data that ends with zero bytes:
+    every mode must give back the same bytes, from files and from the standard input.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.priv = os.path.join(cls.directory.name,"priv.key")
+        cls.pub = os.path.join(cls.directory.name,"pub.key")
+        main(["keygen","--bits","1024","--priv",cls.priv,"--pub",cls.pub])
+        cls.data = random.Random(1234).randbytes(1000) + bytes(300)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_files(self):
+        plain = os.path.join(self.directory.name,"data")
+        with open(plain,"wb") as file:
+            file.write(self.data)
+        for mode in RSATool.Modes:
+            with self.subTest(mode=mode):
+                encrypted = plain + "." + mode
+                decrypted = encrypted + ".out"
+                self.assertEqual(main(["encrypt","-k",self.pub,plain,"-o",encrypted,"--mode",mode]),0)
+                self.assertEqual(main(["decrypt","-k",self.priv,encrypted,"-o",decrypted,"--mode",mode]),0)
+                with open(decrypted,"rb") as file:
+                    self.assertEqual(file.read(),self.data)
+
+    def test_pipe(self):
+        def run(command,key,data):
+            return subprocess.run(
+                [sys.executable,"-m","RSATool",command,"-k",key],
+                input=data,capture_output=True,check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout
+
+        self.assertEqual(run("decrypt",self.priv,run("encrypt",self.pub,self.data)),self.data)
+
+    def test_blocks_mode_is_refused(self):
+        # the blocks lose the zero bytes at the end of the data, they are not a mode
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            main(["encrypt","-k",self.pub,"--mode","blocks"])
+        with self.assertRaises(Exception) as context:
+            RSATool.crypt("encrypt",{},["-"],mode="blocks")
+        self.assertIs(context.exception,RSATool.UnknownMode)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+from benchmark import Benchmark
+
+class ImportTest(unittest.TestCase):
+    """
+    The modules only needed by some features must be imported on first use, see benchmark.py imports.
+    """
+    Lazy = ("json","yaml","base64","gmpy2")
+
+    def test_lazy_imports(self):
+        for module in Benchmark.ImportModules:
+            with self.subTest(module=module):
+                # a new interpreter, the modules imported by the tests don't count
+                seconds, eager = Benchmark.import_module(module)
+                self.assertEqual([name for name in eager if name in ImportTest.Lazy],[])
+
+if __name__ == "__main__":
+    unittest.main()